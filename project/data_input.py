@@ -2,10 +2,29 @@
 # -*- coding: utf-8 -*-
 
 import re
+import os
+import glob
+import json
 import math
+import shutil
+import hashlib
+import tempfile
 
+import numpy
+
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from os import path
 from project.models import CVRPData
+from project.distances import euclidean, LazyEuclideanMatrix
+
+# Bump whenever parsing or compiled data changes, so old cached instances are ignored
+PARSER_VERSION = 2
+
+# Compiled instances cache used by run.py, in the XDG cache directory
+DEFAULT_CACHE_DIR = path.join(os.environ.get('XDG_CACHE_HOME') or '~/.cache', 'monte-carlo-cvrp')
+
+EDGE_WEIGHT_FORMATS = ['FULL_MATRIX', 'UPPER_ROW', 'LOWER_ROW', 'UPPER_DIAG_ROW', 'LOWER_DIAG_ROW']
 
 class ParseException(Exception):
     """Exception raised when something unexpected occurs in a TSPLIB file parsing"""
@@ -87,33 +106,48 @@ def _parse_nodes_section(f, current_section, nodes):
 
     return section
 
-def _parse_edge_weight(f, nodes):
+def _edge_weight_count(edge_weight_format, nodes):
+    """Returns how many weights an EDGE_WEIGHT_SECTION has for `edge_weight_format`"""
+    if edge_weight_format == 'FULL_MATRIX':
+        return nodes * nodes
+    elif edge_weight_format in ['UPPER_ROW', 'LOWER_ROW']:
+        return nodes * (nodes - 1) // 2
+    elif edge_weight_format in ['UPPER_DIAG_ROW', 'LOWER_DIAG_ROW']:
+        return nodes * (nodes + 1) // 2
+
+    raise ParseException('EDGE_WEIGHT_FORMAT {} not supported'.format(edge_weight_format))
+
+def _parse_edge_weight(f, nodes, edge_weight_format):
     """Parse TSPLIB EDGE_WEIGHT_SECTION from file f
 
-    Supports only FULL_MATRIX for now
+    Weights are read as a stream of numbers (rows may wrap across lines) straight
+    into a flat array, in file order. Supports EDGE_WEIGHT_FORMATS formats
     """
-    matrix = []
+    count = _edge_weight_count(edge_weight_format, nodes)
+    weights = numpy.empty(count, dtype=numpy.int64)
 
     n = 0
 
     for line in f:
-        line = strip(line)
-
-        regex = re.compile('\s+')
+        tokens = line.split()
 
-        row = regex.split(line)
+        if n + len(tokens) > count:
+            raise ParseException('Too many values in section EDGE_WEIGHT_SECTION')
 
-        matrix.append(row)
+        try:
+            weights[n:n + len(tokens)] = [int(token) for token in tokens]
+        except ValueError:
+            raise ParseException('Invalid value in section EDGE_WEIGHT_SECTION: {}'.format(strip(line)))
 
-        n = n + 1
+        n = n + len(tokens)
 
-        if n == nodes:
+        if n == count:
             break
 
-    if n != nodes:
-        raise ParseException('Missing {} nodes definition from section EDGE_WEIGHT_SECTION'.format(nodes - n))
+    if n != count:
+        raise ParseException('Missing {} values from section EDGE_WEIGHT_SECTION'.format(count - n))
 
-    return matrix
+    return weights
 
 def calculate_euc_distance(a, b):
     """Calculates Eclidian distances from two points a and b
@@ -138,63 +172,102 @@ def _post_process_specs(specs):
     for s in integer_specs:
         specs[s] = int(specs[s])
 
-def _create_node_matrix_from_coord_section(specs):
-    """Transformed parsed data from NODE_COORD_SECTION into an upper triangular matrix
+def calculate_euc_distance_matrix(points):
+    """Calculates Euclidian distances between all points in `points`
 
-    Calculates distances between nodes
-    'MATRIX' key added to `specs`
+    Points is a (n, 2) array. Returns a (n, n) integer matrix rounded the same
+    way `calculate_euc_distance` does (round half to even, as Python 3 round)
     """
-    distances = specs['NODE_COORD_SECTION']
+    points = numpy.asarray(points, dtype=numpy.float64)
+
+    return euclidean(points[:, numpy.newaxis], points[numpy.newaxis, :])
 
-    specs['MATRIX'] = {}
+def _coordinates_array(specs):
+    """Returns NODE_COORD_SECTION as a (n, 2) array indexed by node id"""
+    coordinates = specs['NODE_COORD_SECTION']
 
-    for i in distances:
-        origin = tuple(distances[i])
+    ids = sorted(coordinates)
 
-        specs['MATRIX'][i] = {}
+    points = numpy.zeros((ids[-1] + 1, 2), dtype=numpy.float64)
+    points[ids] = [coordinates[i] for i in ids]
 
-        for j in specs['NODE_COORD_SECTION']:
-            destination = tuple(distances[j])
+    return ids, points
 
-            distance = calculate_euc_distance(origin, destination)
+def _create_node_matrix_from_coord_section(specs):
+    """Transformed parsed data from NODE_COORD_SECTION into a dense distance matrix
 
-            #
-            # Upper triangular matrix
-            # if i > j, ij = 0
-            #
-            if i > j:
-                continue
+    Calculates distances between all nodes at once
+    'MATRIX' key added to `specs`, indexed by node id
+    """
+    ids, points = _coordinates_array(specs)
 
-            specs['MATRIX'][i][j] = distance
+    matrix = numpy.zeros((len(points), len(points)), dtype=numpy.int64)
+    matrix[numpy.ix_(ids, ids)] = calculate_euc_distance_matrix(points[ids])
 
-def _create_node_matrix_from_full_matrix(specs):
-    """Transform parsed data from EDGE_WEIGHT_SECTION into an upper triangular matrix
+    specs['MATRIX'] = matrix
 
-    'MATRIX' key added to `specs`
+def _create_lazy_node_matrix_from_coord_section(specs):
+    """Transformed parsed data from NODE_COORD_SECTION into a lazy distance matrix
+
+    Only coordinates are kept, distances are calculated on demand
+    'MATRIX' key added to `specs`, indexed by node id
+    """
+    ids, points = _coordinates_array(specs)
+
+    specs['MATRIX'] = LazyEuclideanMatrix(points)
+
+def _edge_weight_indices(edge_weight_format, nodes):
+    """Returns (rows, columns) matrix indices of each EDGE_WEIGHT_SECTION value, in file order"""
+    if edge_weight_format == 'FULL_MATRIX':
+        return numpy.indices((nodes, nodes)).reshape(2, -1)
+    elif edge_weight_format == 'UPPER_ROW':
+        return numpy.triu_indices(nodes, 1)
+    elif edge_weight_format == 'LOWER_ROW':
+        return numpy.tril_indices(nodes, -1)
+    elif edge_weight_format == 'UPPER_DIAG_ROW':
+        return numpy.triu_indices(nodes)
+    elif edge_weight_format == 'LOWER_DIAG_ROW':
+        return numpy.tril_indices(nodes)
+
+    raise ParseException('EDGE_WEIGHT_FORMAT {} not supported'.format(edge_weight_format))
+
+def _create_node_matrix_from_edge_weights(specs):
+    """Transform parsed data from EDGE_WEIGHT_SECTION into a dense distance matrix
+
+    The matrix is symmetric: for FULL_MATRIX, only its upper triangle is used
+    'MATRIX' key added to `specs`, indexed by node id
     """
-    old_matrix = specs['EDGE_WEIGHT_SECTION']
     nodes = specs['DIMENSION']
+    rows, columns = _edge_weight_indices(specs['EDGE_WEIGHT_FORMAT'], nodes)
+    weights = specs['EDGE_WEIGHT_SECTION']
 
-    specs['MATRIX'] = {}
+    if specs['EDGE_WEIGHT_FORMAT'] == 'FULL_MATRIX':
+        upper = rows <= columns
+        rows, columns, weights = rows[upper], columns[upper], weights[upper]
 
-    for i in range(nodes):
-        specs['MATRIX'][i + 1] = {}
+    rows, columns = rows + 1, columns + 1 # node ids start at 1
 
-        for j in range(nodes):
-            if i > j:
-                continue
+    matrix = numpy.zeros((nodes + 1, nodes + 1), dtype=numpy.int64)
+    matrix[columns, rows] = weights
+    matrix[rows, columns] = weights
 
-            specs['MATRIX'][i + 1][j + 1] = int(old_matrix[i][j])
+    specs['MATRIX'] = matrix
 
-def _create_node_matrix(specs):
-    """Transform parsed data into an upper triangular matrix
+def _create_node_matrix(specs, lazy=False):
+    """Transform parsed data into a distance matrix
 
     'MATRIX' key added to `specs`
     """
-    if specs['EDGE_WEIGHT_TYPE'] == 'EUC_2D':
+    if lazy and specs['EDGE_WEIGHT_TYPE'] != 'EUC_2D':
+        raise ParseException('Lazy distances are only supported for EUC_2D, found {}'.format(
+            specs['EDGE_WEIGHT_TYPE']))
+
+    if lazy:
+        _create_lazy_node_matrix_from_coord_section(specs)
+    elif specs['EDGE_WEIGHT_TYPE'] == 'EUC_2D':
         _create_node_matrix_from_coord_section(specs)
-    elif specs['EDGE_WEIGHT_FORMAT'] == 'FULL_MATRIX':
-        _create_node_matrix_from_full_matrix(specs)
+    elif specs['EDGE_WEIGHT_FORMAT'] in EDGE_WEIGHT_FORMATS:
+        _create_node_matrix_from_edge_weights(specs)
     else:
         raise ParseException('Could not create node matrix: Invalid EDGE_WEIGHT_TYPE or EDGE_WEIGHT_FORMAT')
 
@@ -210,7 +283,7 @@ def _setup_demands(specs):
     """Setup demand model"""
     specs['DEMAND'] = specs['DEMAND_SECTION']
 
-def _post_process_data(specs):
+def _post_process_data(specs, lazy=False):
     """Post-process specs data after complete parsing
 
     Processes:
@@ -219,12 +292,15 @@ def _post_process_data(specs):
         - Setup demand model
     """
 
-    _create_node_matrix(specs)
+    _create_node_matrix(specs, lazy)
     _setup_depot(specs)
     _setup_demands(specs)
 
-def _parse_tsplib(f):
-    """Parses a TSPLIB file descriptor and returns a dict containing the problem definition"""
+def _parse_tsplib(f, lazy=False):
+    """Parses a TSPLIB file descriptor and returns a dict containing the problem definition
+
+    If `lazy` is True, distances are not calculated upfront (EUC_2D only)
+    """
     line = ''
 
     specs = {}
@@ -258,7 +334,7 @@ def _parse_tsplib(f):
 
     if specs['EDGE_WEIGHT_TYPE'] == 'EUC_2D':
         used_data.append('NODE_COORD_SECTION')
-    elif specs['EDGE_WEIGHT_FORMAT'] == 'FULL_MATRIX':
+    elif specs['EDGE_WEIGHT_FORMAT'] in EDGE_WEIGHT_FORMATS:
         used_data.append('EDGE_WEIGHT_SECTION')
     else:
         raise ParseException('EDGE_WEIGHT_TYPE or EDGE_WEIGHT_FORMAT not supported')
@@ -276,7 +352,7 @@ def _parse_tsplib(f):
                 elif d in ['NODE_COORD_SECTION', 'DEMAND_SECTION']:
                     specs[d] = _parse_nodes_section(f, d, specs['DIMENSION'])
                 elif d == 'EDGE_WEIGHT_SECTION':
-                    specs[d] = _parse_edge_weight(f, specs['DIMENSION'])
+                    specs[d] = _parse_edge_weight(f, specs['DIMENSION'], specs['EDGE_WEIGHT_FORMAT'])
 
         if len(specs) == len(used_specs) + len(used_data):
             break
@@ -285,20 +361,91 @@ def _parse_tsplib(f):
         missing_specs = set(specs).symmetric_difference(set(used_specs).union(set(used_data)))
         raise ParseException('Error parsing TSPLIB data: specs {} missing'.format(missing_specs))
 
-    _post_process_data(specs)
+    _post_process_data(specs, lazy)
 
     return specs
 
-def read_file(filename):
-    """Reads a TSPLIB file and returns the problem data"""
-    sanitized_filename = sanitize(filename)
+def _cache_key(content):
+    """Returns the compiled instance key for a TSPLIB file content"""
+    digest = hashlib.sha256(content)
+    digest.update('parser-{}'.format(PARSER_VERSION).encode('ascii'))
+
+    return digest.hexdigest()
+
+def _load_compiled(directory):
+    """Loads a compiled instance from `directory`
+
+    Arrays are memory-mapped, so only the parts actually used are read from disk
+    """
+    with open(path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
 
-    f = open(sanitized_filename)
+    def load(name):
+        return numpy.load(path.join(directory, '{}.npy'.format(name)), mmap_mode='r')
+
+    demand_ids = load('demand_ids').tolist()
+    demands = load('demands').tolist()
+
+    return CVRPData({
+        'MATRIX': load('matrix'),
+        'DEMAND': dict(zip(demand_ids, demands)),
+        'DEPOT': meta['DEPOT'],
+        'CAPACITY': meta['CAPACITY'],
+        'SAVINGS': (load('savings_i'), load('savings_j'), load('savings')),
+    })
+
+def _save_compiled(directory, data):
+    """Saves `data` as a compiled instance in `directory`
+
+    Files are written in a temporary directory first, which is then renamed, so
+    concurrent runs never read a partially written instance
+    """
+    parent = path.dirname(directory)
+
+    if not path.isdir(parent):
+        os.makedirs(parent)
+
+    temporary = tempfile.mkdtemp(dir=parent)
+
+    try:
+        nodes = list(data.nodes())
+        savings_i, savings_j, savings = data.savings()
+
+        arrays = {
+            'matrix': data.matrix(),
+            'demand_ids': numpy.array([node.name() for node in nodes], dtype=numpy.int64),
+            'demands': numpy.array([node.demand() for node in nodes], dtype=numpy.int64),
+            'savings_i': savings_i,
+            'savings_j': savings_j,
+            'savings': savings,
+        }
+
+        for name, array in arrays.items():
+            numpy.save(path.join(temporary, '{}.npy'.format(name)), array)
+
+        with open(path.join(temporary, 'meta.json'), 'w') as f:
+            json.dump({
+                'PARSER_VERSION': PARSER_VERSION,
+                'DEPOT': data.depot().name(),
+                'CAPACITY': data.capacity(),
+            }, f)
+
+        os.rename(temporary, directory)
+    except OSError:
+        if not path.isdir(directory): # Lost a race against another run: just keep its instance
+            raise
+    finally:
+        if path.isdir(temporary):
+            shutil.rmtree(temporary)
+
+def _read_tsplib(filename, lazy=False):
+    """Parses a TSPLIB file and returns the problem data"""
+    f = open(filename)
 
     specs = None
 
     try:
-        specs = _parse_tsplib(f)
+        specs = _parse_tsplib(f, lazy)
     except ParseException:
         raise
     finally: # 'finally' is executed even when we re-raise exceptions
@@ -308,3 +455,149 @@ def read_file(filename):
         raise Exception('Not a CVRP TSPLIB problem. Found: {}'.format(specs['TYPE']))
 
     return CVRPData(specs)
+
+def read_file(filename, cache_dir=None, lazy=False):
+    """Reads a TSPLIB file and returns the problem data
+
+    If `cache_dir` is given, the compiled instance (distance matrix, demands, depot,
+    capacity and sorted Clarke and Wright savings) is kept there, keyed by file
+    content and parser version, so following reads skip parsing and sorting. If
+    it can not be written, the instance is just returned
+
+    If `lazy` is True, only coordinates are kept and distances are calculated on
+    demand (EUC_2D only). Meant for instances whose distance matrix does not fit in
+    memory, so no compiled instance is cached in this mode
+    """
+    sanitized_filename = sanitize(filename)
+
+    if cache_dir is None or lazy:
+        return _read_tsplib(sanitized_filename, lazy)
+
+    directory = _compiled_directory(sanitized_filename, cache_dir)
+
+    if path.isdir(directory):
+        return _load_compiled(directory)
+
+    data = _read_tsplib(sanitized_filename)
+
+    try:
+        _save_compiled(directory, data)
+    except OSError:
+        pass # The cache is best-effort, e.g. `cache_dir` may not be writable
+
+    return data
+
+def _compiled_directory(filename, cache_dir):
+    """Returns the compiled instance directory of a TSPLIB file in `cache_dir`"""
+    with open(filename, 'rb') as f:
+        return path.join(sanitize(cache_dir), _cache_key(f.read()))
+
+def _compile(filename, cache_dir):
+    """Compiles a TSPLIB file in `cache_dir` (see read_file), unless it is already there
+
+    Returns the compiled instance directory, or None if it could not be written
+    """
+    directory = _compiled_directory(filename, cache_dir)
+
+    if not path.isdir(directory):
+        try:
+            _save_compiled(directory, _read_tsplib(filename))
+        except OSError:
+            return None
+
+    return directory
+
+def vehicles_from_filename(filename):
+    """Returns the vehicles number encoded in a TSPLIB file name, or None
+
+    Same rule as bin/run.sh: the digits after the last '-<letters>' part
+    Example: input/Augerat/A-n32-k5.vrp -> 5
+    """
+    match = re.match(r'.*-[a-zA-Z]*([0-9]+).*\.vrp$', filename)
+
+    if match is None:
+        return None
+
+    return int(match.group(1))
+
+class Catalog(Mapping):
+    """Read-only mapping from instance name (file name without extension) to CVRPData
+
+    Files are compiled in parallel by a process pool as soon as the catalog is
+    created (see read_file, in a temporary directory without `cache_dir`); each
+    instance is loaded, memory-mapped, when first accessed
+    """
+
+    def __init__(self, filenames, cache_dir=None, processes=None):
+        """Class constructor
+
+        Parameters:
+            filenames: TSPLIB files
+            cache_dir: compiled instances cache directory (see read_file)
+            processes: pool size (default: CPU count). If 1, files are read on first access
+        """
+        self._filenames = {}
+
+        for filename in sorted(filenames):
+            name = path.splitext(path.basename(filename))[0]
+
+            if name in self._filenames:
+                raise Exception('Duplicated instance name {} ({} and {})'.format(
+                    name, self._filenames[name], filename))
+
+            self._filenames[name] = sanitize(filename)
+
+        self._cache_dir = cache_dir
+        self._temporary = None
+        self._instances = {}
+        self._futures = {}
+
+        if processes != 1 and len(self._filenames) > 1:
+            if cache_dir is None:
+                self._temporary = tempfile.TemporaryDirectory()
+                cache_dir = self._temporary.name
+
+            executor = ProcessPoolExecutor(max_workers=processes)
+
+            for name, filename in self._filenames.items():
+                self._futures[name] = executor.submit(_compile, filename, cache_dir)
+
+            executor.shutdown(wait=False) # submitted files are still compiled
+
+    def __getitem__(self, name):
+        if name not in self._instances:
+            future = self._futures.pop(name, None)
+            directory = future.result() if future is not None else None
+
+            if directory is not None:
+                self._instances[name] = _load_compiled(directory)
+            else:
+                self._instances[name] = read_file(self._filenames[name], self._cache_dir)
+
+        return self._instances[name]
+
+    def __iter__(self):
+        return iter(self._filenames)
+
+    def __len__(self):
+        return len(self._filenames)
+
+    def filename(self, name):
+        """Returns the file instance `name` was read from"""
+        return self._filenames[name]
+
+    def vehicles(self, name):
+        """Returns the vehicles number from instance `name` file name, or None"""
+        return vehicles_from_filename(self._filenames[name])
+
+def read_catalog(pattern, cache_dir=None, processes=None):
+    """Reads all TSPLIB files from a directory (*.vrp) or a glob pattern in parallel
+
+    Returns a Catalog
+    """
+    pattern = sanitize(pattern)
+
+    if path.isdir(pattern):
+        pattern = path.join(pattern, '*.vrp')
+
+    return Catalog(glob.glob(pattern), cache_dir, processes)
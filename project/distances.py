@@ -0,0 +1,119 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+from collections import OrderedDict
+
+import numpy
+
+def euclidean(origins, destinations):
+    """Calculates rounded Euclidian distances between points in `origins` and `destinations`
+
+    Both are (..., 2) arrays, broadcast against each other. Rounds half to even,
+    as Python 3 round does, so results match data_input.calculate_euc_distance
+    """
+    origins = numpy.asarray(origins, dtype=numpy.float64)
+    destinations = numpy.asarray(destinations, dtype=numpy.float64)
+
+    dx = origins[..., 0] - destinations[..., 0]
+    dy = origins[..., 1] - destinations[..., 1]
+
+    return numpy.rint(numpy.sqrt(dx * dx + dy * dy)).astype(numpy.int64)
+
+class LazyEuclideanMatrix(object):
+    """Distance matrix computed on demand from node coordinates
+
+    Behaves like the dense matrix used by CVRPData (`item`, `shape` and
+    `matrix[origins, destinations]` indexing), but only keeps coordinates plus a
+    bounded LRU cache of row blocks, so memory is O(n) instead of O(n^2)
+    """
+
+    DEFAULT_BLOCK_BYTES = 4 * 1024 * 1024
+    DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, points, block_rows=None, max_cache_bytes=None):
+        """Class constructor
+
+        Parameters:
+            points: (n, 2) coordinates array, indexed by node id
+            block_rows: rows computed (and cached) together
+            max_cache_bytes: upper bound for the memory used by cached blocks
+        """
+        self._points = numpy.ascontiguousarray(points, dtype=numpy.float64)
+
+        size = len(self._points)
+        row_bytes = size * numpy.dtype(numpy.int64).itemsize
+
+        if block_rows is None:
+            block_rows = max(1, self.DEFAULT_BLOCK_BYTES // row_bytes)
+
+        if max_cache_bytes is None:
+            max_cache_bytes = self.DEFAULT_CACHE_BYTES
+
+        self._block_rows = block_rows
+        self._max_blocks = max(1, max_cache_bytes // (block_rows * row_bytes))
+        self._blocks = OrderedDict()
+
+        self.shape = (size, size)
+        self.dtype = numpy.dtype(numpy.int64)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def points(self):
+        """Returns the coordinates array"""
+        return self._points
+
+    def _block(self, index):
+        """Returns the row block `index`, computing it if not cached"""
+        block = self._blocks.get(index)
+
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+
+        start = index * self._block_rows
+        stop = min(start + self._block_rows, self.shape[0])
+
+        block = euclidean(self._points[start:stop, numpy.newaxis], self._points[numpy.newaxis, :])
+
+        self._blocks[index] = block
+
+        if len(self._blocks) > self._max_blocks:
+            self._blocks.popitem(last=False)
+
+        return block
+
+    def row(self, i):
+        """Returns all distances from node id i"""
+        return self._block(i // self._block_rows)[i % self._block_rows]
+
+    def item(self, i, j):
+        """Returns the distance between node ids i and j as a Python int
+
+        Uses a cached row block when there is one, computes the value alone otherwise
+        """
+        for a, b in [(i, j), (j, i)]:
+            block = self._blocks.get(a // self._block_rows)
+
+            if block is not None:
+                return int(block[a % self._block_rows, b])
+
+        x1, y1 = self._points[i]
+        x2, y2 = self._points[j]
+
+        return int(round(math.sqrt(((x1 - x2) ** 2) + ((y1 - y2) ** 2))))
+
+    def __getitem__(self, key):
+        """Returns distances for `matrix[origins, destinations]` (scalars or id arrays)"""
+        origins, destinations = key
+
+        if numpy.ndim(origins) == 0:
+            return self.row(int(origins))[destinations]
+
+        return euclidean(self._points[origins], self._points[destinations])
+
+    def cached_blocks(self):
+        """Returns how many row blocks are cached"""
+        return len(self._blocks)
@@ -1,8 +1,103 @@
 #!/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+
+import numpy
+
+from collections import deque
+
+# When set (e.g. CVRP_CHECK_COSTS=1 in debug runs), incrementally maintained costs
+# are checked against a full recompute every time they are read
+CHECK_COSTS = bool(os.environ.get('CVRP_CHECK_COSTS'))
+
+def check_cost(cached, computed):
+    """Raises an exception if a cached cost differs from its full recompute"""
+    if cached != computed:
+        raise Exception('Cached cost {} differs from computed cost {}'.format(cached, computed))
+
+class VersionedArray(object):
+    """Persistent array: `update` returns a new version, and older versions stay valid
+
+    All versions share a single list, holding the values of the last accessed
+    version; every other version keeps the changes leading to it (Baker's trick).
+    Accessing that version is O(1); accessing another one first undoes and redoes
+    the changes in between. Versions changed and accessed in sequence (solutions
+    processing pairs, rollouts restarting from a decision) pay O(1) per change
+    """
+
+    __slots__ = ('_values', '_changes', '_next')
+
+    def __init__(self, values):
+        """Class constructor
+
+        Parameters:
+            values: initial values, copied
+        """
+        self._values = list(values)
+        self._changes = None
+        self._next = None
+
+    def _reroot(self):
+        """Makes the shared list hold this version values"""
+        path = []
+        version = self
+
+        while version._values is None:
+            path.append(version)
+            version = version._next
+
+        values = version._values
+
+        for changed in reversed(path):
+            # `version` (the current holder) keeps the changes back to its values
+            undo = [(index, values[index]) for index, value in changed._changes]
+
+            for index, value in changed._changes:
+                values[index] = value
+
+            version._values, version._changes, version._next = None, undo, changed
+            changed._values, changed._changes, changed._next = values, None, None
+
+            version = changed
+
+        return values
+
+    def get(self, index):
+        """Returns the value at `index`"""
+        return self._reroot()[index]
+
+    def update(self, changes):
+        """Returns a new version with `changes`, a list of (index, value), applied"""
+        values = self._reroot()
+
+        new_version = VersionedArray.__new__(VersionedArray)
+        new_version._values, new_version._changes, new_version._next = values, None, None
+
+        self._changes = [(index, values[index]) for index, value in changes]
+        self._values = None
+        self._next = new_version
+
+        for index, value in changes:
+            values[index] = value
+
+        return new_version
+
+    def __iter__(self):
+        return iter(list(self._reroot()))
+
+    def __len__(self):
+        return len(self._reroot())
+
 class Route(object):
-    """Class for modelling a CVRP route"""
+    """Class for modelling a CVRP route
+
+    Nodes are kept in a deque along with a position index (node name -> absolute
+    position), so both ends and position queries are O(1). The route length is
+    updated on every change, so reading it is O(1) too
+    """
+
+    __slots__ = ('_problem', '_capacity', '_demand', '_nodes', '_positions', '_head', '_length')
 
     def __init__(self, cvrp_problem, capacity):
         """Class constructor
@@ -15,7 +110,53 @@ class Route(object):
         self._problem = cvrp_problem
         self._capacity = capacity
         self._demand = 0
-        self._nodes = []
+        self._nodes = deque()
+        self._positions = {}
+        self._head = 0 # absolute position of the first node
+        self._length = 0
+
+    @classmethod
+    def from_nodes(cls, cvrp_problem, capacity, nodes):
+        """Returns a route visiting `nodes` in order
+
+        Nodes allocation is not changed: meant for routes shared between solutions,
+        which are never changed after creation (see `joined`)
+        """
+        route = cls(cvrp_problem, capacity)
+
+        route._nodes.extend(nodes)
+        route._positions = {node._name: position for position, node in enumerate(route._nodes)}
+        route._demand = sum([node._demand for node in route._nodes])
+        route._length = route.compute_length()
+
+        if route._demand > capacity:
+            raise Exception('Trying to allocate more than route capacity')
+
+        return route
+
+    def joined(self, route):
+        """Returns a new route visiting this route nodes and then `route` nodes
+
+        Neither route nor nodes allocation is changed, the new length is computed
+        from the saving of joining both routes, in O(1) distance lookups
+        """
+        if self._demand + route._demand > self._capacity:
+            raise Exception('Trying to allocate more than route capacity')
+
+        distance = self._problem.distance_by_id
+        depot = self._problem.depot()._name
+        last, first = self._name_at(len(self._nodes) - 1), route._name_at(0)
+
+        saving = distance(last, depot) + distance(depot, first) - distance(last, first)
+
+        new_route = Route(self._problem, self._capacity)
+        new_route._nodes.extend(self._nodes)
+        new_route._nodes.extend(route._nodes)
+        new_route._positions = {node._name: position for position, node in enumerate(new_route._nodes)}
+        new_route._demand = self._demand + route._demand
+        new_route._length = self._length + route._length - saving
+
+        return new_route
 
     def capacity(self):
         """Returns the route capacity"""
@@ -32,21 +173,23 @@ class Route(object):
 
     def length(self):
         """Returns the route length (cost)"""
-        cost = 0
-        depot = self._problem.depot()
+        if CHECK_COSTS:
+            check_cost(self._length, self.compute_length())
+
+        return self._length
 
-        last = depot
-        for i in self._nodes:
-            a, b = last, i
-            if a > b:
-                a, b = b, a
+    def compute_length(self):
+        """Computes the route length from scratch"""
+        depot = self._problem.depot().name()
 
-            cost = cost + self._problem.distance(a, b)
-            last = i
+        return self._problem.path_length([depot] + [node.name() for node in self._nodes] + [depot])
 
-        cost = cost + self._problem.distance(depot, last)
+    def _name_at(self, index):
+        """Returns the name of the node at `index`, or the depot name if out of the route"""
+        if 0 <= index < len(self._nodes):
+            return self._nodes[index]._name
 
-        return cost
+        return self._problem.depot()._name
 
     def can_allocate(self, nodes):
         """Returns True if this route can allocate nodes in `nodes` list"""
@@ -70,17 +213,40 @@ class Route(object):
             node._allocation = self
             nodes_demand = nodes_demand + node.demand()
             if append:
+                self._insert_cost(self._name_at(len(self._nodes) - 1), node._name, self._name_at(len(self._nodes)))
+                self._positions[node._name] = self._head + len(self._nodes)
                 self._nodes.append(node)
             else:
-                self._nodes.insert(0, node)
+                self._insert_cost(self._name_at(-1), node._name, self._name_at(0))
+                self._head = self._head - 1
+                self._positions[node._name] = self._head
+                self._nodes.appendleft(node)
 
         self._demand = self._demand + nodes_demand
 
     def deallocate(self, nodes):
-        """Deallocates all nodes from `nodes` list from this route"""
+        """Deallocates all nodes from `nodes` list from this route
+
+        O(1) per node removed from either end of the route, O(route length) otherwise
+        """
         nodes_demand = 0
         for node in nodes:
-            self._nodes.remove(node)
+            index = self.position(node)
+
+            self._insert_cost(self._name_at(index - 1), node._name, self._name_at(index + 1), -1)
+
+            if index == 0:
+                self._nodes.popleft()
+                self._head = self._head + 1
+            elif index == len(self._nodes) - 1:
+                self._nodes.pop()
+            else:
+                del self._nodes[index]
+
+                for position, other in enumerate(self._nodes):
+                    self._positions[other._name] = self._head + position
+
+            del self._positions[node._name]
             node._allocation = None
             nodes_demand = nodes_demand + node.demand()
 
@@ -89,23 +255,50 @@ class Route(object):
         if self._demand < 0:
             raise Exception('Trying to deallocate more than previously allocated')
 
+    def _insert_cost(self, previous, name, following, sign=1):
+        """Updates the route length for inserting (or removing, if sign is -1) node
+        `name` between nodes `previous` and `following`"""
+        distance = self._problem.distance_by_id
+
+        delta = distance(previous, name) + distance(name, following) - distance(previous, following)
+
+        self._length = self._length + sign * delta
+
+    def position(self, node):
+        """Returns the node position in the route (0 is the first node)"""
+        position = self._positions.get(node._name)
+
+        if position is None:
+            raise ValueError('{} is not in route'.format(node))
+
+        return position - self._head
+
     def is_interior(self, node):
         """Returns True if node is interior to the route, i.e., not adjascent to depot"""
-        return self._nodes.index(node) != 0 and self._nodes.index(node) != len(self._nodes) - 1
+        return not self.first(node) and not self.last(node)
+
+    def first(self, node):
+        """Returns True if node is the first node in the route"""
+        return self.position(node) == 0
 
     def last(self, node):
         """Returns True if node is the last node in the route"""
-        return self._nodes.index(node) == len(self._nodes) - 1
+        return self.position(node) == len(self._nodes) - 1
+
+    def __len__(self):
+        return len(self._nodes)
 
     def __str__(self):
-        return str(self._nodes)
+        return str(list(self._nodes))
 
     def __repr__(self):
-        return str(self._nodes)
+        return str(list(self._nodes))
 
 class Node(object):
     """Class for modelling a CVRP node"""
 
+    __slots__ = ('_name', '_demand', '_allocation')
+
     def __init__(self, name, demand):
         """Class constructor
 
@@ -155,13 +348,23 @@ class Node(object):
 
     def __lt__(self, other):
         if isinstance(other, Node):
-            return self._name - other._name
+            return self._name < other._name
+
+        return self._name < other
 
     def __hash__(self):
         return self._name.__hash__()
 
 class CVRPData(object):
-    """Class for modelling a CVRP problem data"""
+    """Class for modelling a CVRP problem data
+
+    Distances are kept in a dense symmetric integer matrix indexed by node id
+    (row and column 0 are unused, since TSPLIB node ids start at 1)
+
+    Values derived from the problem data (customers, depot distances, savings)
+    are computed once and kept as read-only arrays, shared by every solver using
+    this instance. Call `invalidate` if the problem data is ever changed
+    """
 
     def __init__(self, data):
         """Class constructor
@@ -171,41 +374,60 @@ class CVRPData(object):
         Parameters:
             data: TSPLIB parsed data
         """
-        self._nodes = {i: Node(i, data['DEMAND'][i]) for i in data['MATRIX']}
-        self._matrix = {}
+        self._nodes = {i: Node(i, data['DEMAND'][i]) for i in data['DEMAND']}
         self._capacity = data['CAPACITY']
-        self._depot = None
+        self._depot = self._nodes.get(data['DEPOT'])
 
-        for i in data['MATRIX']:
+        if self._depot is None:
+            raise Exception('Depot not found')
 
-            x = self._nodes[i]
-            self._matrix[x] = {}
+        self._distances = self._dense_matrix(data['MATRIX'])
+        self._precomputed = {}
 
-            if i == data['DEPOT']:
-                self._depot = x # x, not i!!
+        if data.get('SAVINGS') is not None:
+            self._precomputed['savings'] = data['SAVINGS']
 
-            for j in data['MATRIX']:
-                if i > j:
-                    continue
+    def _dense_matrix(self, matrix):
+        """Builds the dense distance matrix
 
-                y = self._nodes[j]
+        `matrix` is either a dense array indexed by node id, an upper triangular dict
+        matrix or a lazy matrix (e.g. distances.LazyEuclideanMatrix), used as is
+        """
+        if isinstance(matrix, numpy.ndarray):
+            return numpy.ascontiguousarray(matrix, dtype=numpy.int64)
 
-                self._matrix[x][y] = data['MATRIX'][i][j]
+        if not isinstance(matrix, dict):
+            return matrix
 
-        if self._depot is None:
-            raise Exception('Depot not found')
+        size = max(self._nodes) + 1
+        distances = numpy.zeros((size, size), dtype=numpy.int64)
+
+        for i in matrix:
+            for j in matrix[i]:
+                distances[i, j] = distances[j, i] = matrix[i][j]
+
+        return distances
 
     def nodes(self):
         """Returns a generator for iterating over nodes"""
         for i in sorted(self._nodes):
             yield self._nodes[i]
 
+    def node(self, i):
+        """Returns the node with id i"""
+        return self._nodes[i]
+
+    def is_lazy(self):
+        """Returns True if distances are calculated on demand instead of stored"""
+        return not isinstance(self._distances, numpy.ndarray)
+
     def edges(self):
         """Returns a generator for iterating over edges"""
-        for i in sorted(self._matrix.keys()):
-            for j in sorted(self._matrix[i].keys()):
-                if i != j:
-                    yield (i, j)
+        ids = sorted(self._nodes)
+
+        for index, i in enumerate(ids):
+            for j in ids[index + 1:]:
+                yield (self._nodes[i], self._nodes[j])
 
     def depot(self):
         """Returns the depot node"""
@@ -213,13 +435,94 @@ class CVRPData(object):
 
     def distance(self, i, j):
         """Returns the distance between node i and node j"""
-        a, b = i, j
+        return self._distances.item(i._name, j._name)
 
-        if a.name() > b.name():
-            a, b = b, a
+    def distance_by_id(self, i, j):
+        """Returns the distance between nodes with ids i and j"""
+        return self._distances.item(i, j)
 
-        return self._matrix[a][b]
+    def distances(self, origins, destinations):
+        """Returns an array of distances between each pair of ids in `origins` and `destinations`"""
+        return self._distances[numpy.asarray(origins), numpy.asarray(destinations)]
+
+    def path_length(self, ids):
+        """Returns the total length of the path visiting node ids in `ids` order"""
+        ids = numpy.asarray(ids)
+
+        if len(ids) < 2:
+            return 0
+
+        return int(self._distances[ids[:-1], ids[1:]].sum())
+
+    def matrix(self):
+        """Returns the distance matrix (read-only usage expected)"""
+        return self._distances
 
     def capacity(self):
         """Returns vehicles capacity"""
         return self._capacity
+
+    def precomputed(self, key, function):
+        """Returns `function(self)` result, computed once per `key` and cached
+
+        Arrays in the result are made read-only, since they are shared
+        """
+        if key not in self._precomputed:
+            value = function(self)
+
+            for array in (value if isinstance(value, tuple) else (value,)):
+                if isinstance(array, numpy.ndarray):
+                    array.flags.writeable = False
+
+            self._precomputed[key] = value
+
+        return self._precomputed[key]
+
+    def is_precomputed(self, key):
+        """Returns True if the value of `key` is already computed (see `precomputed`)"""
+        return key in self._precomputed
+
+    def invalidate(self):
+        """Discards all precomputed values (see `precomputed`)"""
+        self._precomputed = {}
+
+    def customers(self):
+        """Returns an array with all node ids but the depot, sorted"""
+        return self.precomputed('customers', lambda data: numpy.array(
+            [i for i in sorted(data._nodes) if i != data._depot._name], dtype=numpy.int32))
+
+    def depot_distances(self):
+        """Returns an array with the distance from depot to each customer, in `customers` order"""
+        return self.precomputed('depot_distances', lambda data: numpy.asarray(
+            data._distances[data._depot._name, data.customers()], dtype=numpy.int64))
+
+    def savings(self):
+        """Returns Clarke and Wright savings as arrays (i, j, saving) of node ids and saving values
+
+        Pairs are every customer pair with i < j, sorted by saving
+        S = d(0,i) + d(0,j) - d(i,j) in descending order. Ties keep ids order.
+        Computed once and cached (it may also be provided by a compiled instance)
+        """
+        return self.precomputed('savings', CVRPData._compute_savings)
+
+    def _compute_savings(self):
+        """Computes `savings` over the whole distance matrix at once"""
+        ids = self.customers()
+        rows, columns = numpy.triu_indices(len(ids), 1)
+
+        depot_distances = self.depot_distances()
+        distances = self._distances[ids[rows], ids[columns]]
+        savings = depot_distances[rows] + depot_distances[columns] - distances
+
+        order = numpy.argsort(-savings, kind='stable')
+
+        return ids[rows[order]], ids[columns[order]], savings[order]
+
+    def savings_order(self):
+        """Returns Clarke and Wright savings order as two arrays of node ids (i, j)
+
+        See `savings`
+        """
+        savings_i, savings_j, values = self.savings()
+
+        return savings_i, savings_j
@@ -0,0 +1,146 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import multiprocessing
+import queue
+import signal
+import sys
+import time
+
+from project import shared
+
+# Best portfolio solution, the algorithm which found it, its cost and the seconds
+# since the portfolio started
+PortfolioResult = collections.namedtuple('PortfolioResult', ['algorithm', 'solution', 'cost', 'elapsed'])
+
+# Shared best cost while no complete solution is known
+NO_COST = sys.maxsize
+
+# Solvers stop this fraction of the portfolio timeout earlier (at most
+# MAX_SOLVER_MARGIN seconds), so solutions they only report at the end of their
+# solve are still received
+SOLVER_MARGIN = 0.1
+MAX_SOLVER_MARGIN = 2.0
+
+# Seconds a stopped solver process has to clean up (e.g. its own worker processes)
+STOP_GRACE = 1.0
+
+def _stop(signum, frame):
+    """SIGTERM handler of solver processes
+
+    Kills the solver worker processes (which would otherwise outlive it, and
+    inherit this handler), then exits running `finally` blocks and context managers
+    """
+    for child in multiprocessing.active_children():
+        child.kill()
+
+    sys.exit(0)
+
+def _run_solver(algorithm, solver, descriptor, vehicles, deadline, target, best_cost, results):
+    """Runs `solver` in a portfolio process until `deadline` (a time.time value), reporting its incumbents to `results`
+
+    Complete solutions also lower `best_cost`, the cost shared by every solver
+    """
+    signal.signal(signal.SIGTERM, _stop)
+
+    data, blocks = shared.attach(descriptor)
+
+    solver.share_bound(best_cost)
+
+    try:
+        for incumbent in solver.incumbents(data, vehicles, max(0, deadline - time.time()), target):
+            solution = incumbent.solution
+            complete = solution.is_complete()
+
+            if complete:
+                with best_cost.get_lock():
+                    if incumbent.cost < best_cost.value:
+                        best_cost.value = incumbent.cost
+
+            routes = [[node.name() for node in route.nodes()] for route in solution.routes()]
+
+            results.put((algorithm, type(solution), routes, incumbent.cost, complete))
+    finally:
+        results.put((algorithm, None, None, None, None))
+
+def run_portfolio(data, vehicles, algorithms, timeout, target=None):
+    """Runs solvers concurrently, each one in its own process, until a global deadline
+
+    Solvers share the instance arrays (see shared.SharedInstance, the complete
+    savings list only if a solver uses it) and the best complete solution cost
+    (see BaseSolver.share_bound), so bound-aware solvers prune against solutions
+    found by the others. Solvers get a shorter timeout
+    (see SOLVER_MARGIN), and may start their own worker processes
+
+    Parameters:
+        data: CVRPData instance
+        vehicles: Vehicles number
+        algorithms: list of tuples (solver, algorithm name)
+        timeout: max processing time in seconds, for the whole portfolio
+        target: stops once a complete solution costing up to `target` is found
+
+    Returns a PortfolioResult with the best solution found (complete solutions
+    first), or None if no solver found any
+    """
+    start = time.time()
+
+    best = None
+    best_complete = False
+
+    deadline = start + timeout - min(SOLVER_MARGIN * timeout, MAX_SOLVER_MARGIN)
+
+    best_cost = multiprocessing.Value('q', NO_COST)
+    results = multiprocessing.Queue()
+
+    uses_savings = any(solver.uses_savings() for solver, algorithm in algorithms)
+
+    with shared.SharedInstance(data, uses_savings) as instance:
+        processes = [
+            multiprocessing.Process(target=_run_solver, args=(
+                algorithm, solver, instance.descriptor(), vehicles, deadline, target, best_cost, results))
+            for solver, algorithm in algorithms
+        ]
+
+        for process in processes:
+            process.start()
+
+        running = len(processes)
+
+        try:
+            while running:
+                remaining = timeout - (time.time() - start)
+
+                if remaining <= 0:
+                    break
+
+                try:
+                    algorithm, solution_class, routes, cost, complete = results.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+                if solution_class is None:
+                    running = running - 1
+                    continue
+
+                if best is None or (complete, -cost) > (best_complete, -best.cost):
+                    solution = solution_class.from_routes(data, vehicles, routes)
+                    best = PortfolioResult(algorithm, solution, cost, time.time() - start)
+                    best_complete = complete
+
+                if best_complete and target is not None and best.cost <= target:
+                    break
+        finally:
+            # Not daemonic, so solvers can have worker processes: stopped explicitly
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+            for process in processes:
+                process.join(STOP_GRACE)
+
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+
+    return best
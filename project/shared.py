@@ -0,0 +1,150 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+from multiprocessing import shared_memory
+
+import numpy
+
+from project.distances import LazyEuclideanMatrix
+from project.models import CVRPData
+
+# Worker process state, see init_worker
+_worker = {}
+
+class SharedInstance(object):
+    """CVRPData arrays (distance matrix, demands, savings) copied to shared memory
+
+    Worker processes rebuild the instance from `descriptor()` with `attach`,
+    reading the same memory blocks instead of a pickled copy of the problem. A
+    lazy Euclidean distance matrix only shares its coordinates (other lazy
+    matrices are sent to workers as is)
+
+    The complete savings list is shared if already computed, or if workers need
+    it (`savings`); otherwise workers using granular savings lists compute them
+    on their own, and nobody computes every pair saving
+
+    Blocks are released by `close` (or at the end of a `with` block)
+    """
+
+    def __init__(self, data, savings=False):
+        """Class constructor
+
+        Parameters:
+            data: CVRPData instance
+            savings: if True, the complete savings list is computed (if needed)
+                and shared (see BaseSolver.uses_savings)
+        """
+        self._blocks = []
+
+        nodes = list(data.nodes())
+
+        arrays = {
+            'demand_ids': numpy.array([node.name() for node in nodes], dtype=numpy.int64),
+            'demands': numpy.array([node.demand() for node in nodes], dtype=numpy.int64),
+        }
+
+        if savings or data.is_precomputed('savings'):
+            arrays['savings_i'], arrays['savings_j'], arrays['savings'] = data.savings()
+
+        lazy_matrix = None
+
+        if not data.is_lazy():
+            arrays['matrix'] = data.matrix()
+        elif isinstance(data.matrix(), LazyEuclideanMatrix):
+            arrays['points'] = data.matrix().points()
+        else:
+            lazy_matrix = data.matrix()
+
+        self._descriptor = {
+            'DEPOT': data.depot().name(),
+            'CAPACITY': data.capacity(),
+            'LAZY_MATRIX': lazy_matrix,
+            'ARRAYS': {},
+        }
+
+        try:
+            for name, array in arrays.items():
+                self._descriptor['ARRAYS'][name] = self._share(array)
+        except Exception:
+            self.close()
+            raise
+
+    def _share(self, array):
+        """Copies `array` to a new shared memory block
+
+        Returns the block description (block name, shape, dtype)
+        """
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self._blocks.append(block)
+
+        numpy.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+
+        return (block.name, array.shape, array.dtype.str)
+
+    def descriptor(self):
+        """Returns a picklable description of the shared instance, see `attach`"""
+        return self._descriptor
+
+    def close(self):
+        """Releases all shared memory blocks"""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def attach(descriptor):
+    """Rebuilds a CVRPData from a SharedInstance `descriptor`, without copying its arrays
+
+    Returns a tuple (data, blocks). Blocks must be kept referenced (and open)
+    while `data` is used
+    """
+    blocks = []
+    arrays = {}
+
+    for name, (block_name, shape, dtype) in descriptor['ARRAYS'].items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+
+        array = numpy.ndarray(shape, dtype=numpy.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+
+        arrays[name] = array
+
+    matrix = descriptor['LAZY_MATRIX']
+
+    if 'matrix' in arrays:
+        matrix = arrays['matrix']
+    elif 'points' in arrays:
+        matrix = LazyEuclideanMatrix(arrays['points'])
+
+    specs = {
+        'MATRIX': matrix,
+        'DEMAND': dict(zip(arrays['demand_ids'].tolist(), arrays['demands'].tolist())),
+        'DEPOT': descriptor['DEPOT'],
+        'CAPACITY': descriptor['CAPACITY'],
+    }
+
+    if 'savings' in arrays:
+        specs['SAVINGS'] = (arrays['savings_i'], arrays['savings_j'], arrays['savings'])
+
+    data = CVRPData(specs)
+
+    return data, blocks
+
+def init_worker(descriptor):
+    """Process pool initializer: attaches the worker process to a SharedInstance
+
+    The instance is then returned by `worker_data`
+    """
+    _worker['data'], _worker['blocks'] = attach(descriptor)
+
+def worker_data():
+    """Returns the CVRPData attached by `init_worker`"""
+    return _worker['data']
@@ -1,8 +1,15 @@
 #!/bin/env python
 # -*- coding: utf-8 -*-
 
+import collections
+import time
+
 from project import models
 
+# A solution found by an anytime solve (see BaseSolver.incumbents): its cost, the
+# seconds since solve started and the solver iteration (e.g. simulation) it was found at
+Incumbent = collections.namedtuple('Incumbent', ['solution', 'cost', 'elapsed', 'iteration'])
+
 class BaseSolution(object):
     """Base abstract class for a CVRP solution"""
 
@@ -62,6 +69,10 @@ class BaseSolution(object):
 
         return length
 
+    def compute_length(self):
+        """Computes the solution length from scratch (see models.CHECK_COSTS)"""
+        return sum([r.compute_length() for r in self._routes])
+
     def can_process(self, pairs):
         """Returns True if this solution can process `pairs`
 
@@ -83,6 +94,33 @@ class BaseSolution(object):
 class BaseSolver(object):
     """Base algorithm solver class"""
 
+    def __init__(self):
+        self._shared_bound = None
+
+    def share_bound(self, value):
+        """Shares the best known solution cost with other solvers
+
+        Parameters:
+            value: object whose `value` attribute is the best complete solution cost
+                found by any solver (e.g. a multiprocessing.Value), or None to stop sharing
+        """
+        self._shared_bound = value
+
+    def external_bound(self):
+        """Returns the best solution cost found by other solvers (see `share_bound`), or None"""
+        if self._shared_bound is None:
+            return None
+
+        return self._shared_bound.value
+
+    def uses_savings(self):
+        """Returns True if the solver reads the complete savings list (CVRPData.savings)
+
+        Processes running it then get the list with the instance (see
+        shared.SharedInstance) instead of computing it themselves
+        """
+        return True
+
     def solve(self, data, vehicles, timeout):
         """Must solves the CVRP problem
 
@@ -96,3 +134,24 @@ class BaseSolver(object):
         Must returns a solution (BaseSolution class derived)
         """
         raise NotImplementedError()
+
+    def incumbents(self, data, vehicles, timeout, target=None):
+        """Solves the CVRP problem, yielding each improving solution as soon as it is found
+
+        Parameters:
+            data: CVRPData instance
+            vehicles: Vehicles number
+            timeout: max processing time in seconds
+            target: stops once a solution costing up to `target` is found
+
+        The caller may stop earlier (e.g. at its own deadline or gap) by just not
+        iterating anymore
+
+        Returns a generator of Incumbent tuples, with increasingly better solutions.
+        Solvers without intermediate solutions yield only the `solve` result
+        """
+        start = time.time()
+
+        solution = self.solve(data, vehicles, timeout)
+
+        yield Incumbent(solution, solution.length(), time.time() - start, 1)
@@ -1,34 +1,482 @@
 #!/bin/env python
 # -*- coding: utf-8 -*-
 
+import collections
+import math
+import multiprocessing
+import queue
 import random
+import statistics
+import threading
 import time
 
-from project.solvers import clarke_wright
+from concurrent import futures
+
+from project import shared
+from project.solvers import clarke_wright, sampling
+from project.solvers.base import Incumbent
+from project.solvers.construction import SavingsConstruction
+
+# Worker process solvers and savings lists, by (neighbours, savings_threshold)
+_worker_solvers = {}
 
 class BinaryMCSCWSSolution(clarke_wright.ClarkeWrightSolution):
     """Solution class for a BinaryMCS-CWS algorithm"""
 
+class TranspositionTable(object):
+    """Bounded cache of simulation statistics (sampling.RunningStatistics) by state hash
+
+    Least recently used states are dropped once the table is full
+    """
+
+    # Memory of an entry (key, statistics and LRU bookkeeping), rounded up (about 330 bytes measured)
+    ENTRY_BYTES = 512
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        """Class constructor
+
+        Parameters:
+            max_entries: max cached states
+            max_bytes: max memory, as a number of entries (ENTRY_BYTES each)
+        """
+        if max_entries is None and max_bytes is None:
+            raise Exception('Transposition table needs max_entries or max_bytes')
+
+        if max_entries is None:
+            max_entries = max_bytes // self.ENTRY_BYTES
+
+        self._max_entries = max(1, max_entries)
+        self._entries = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def statistics(self, key):
+        """Returns the statistics of state `key`, new (empty) ones if not cached
+
+        Returned statistics are kept in the table, so simulations added to them are cached too
+        """
+        entries = self._entries
+
+        if key in entries:
+            self._hits = self._hits + 1
+            entries.move_to_end(key)
+
+            return entries[key]
+
+        self._misses = self._misses + 1
+
+        statistics = entries[key] = sampling.RunningStatistics()
+
+        while len(entries) > self._max_entries:
+            entries.popitem(last=False)
+
+        return statistics
+
+    def hits(self):
+        return self._hits
+
+    def misses(self):
+        return self._misses
+
+    def __len__(self):
+        return len(self._entries)
+
+class RolloutScheduler(object):
+    """Hands out simulations to merge decisions from a global budget
+
+    Every decision has a quota of simulation pairs; a decision settled earlier
+    (see `eliminated`) banks the simulations it did not use, and later decisions
+    may spend the bank, up to `max_quota` pairs. Once the budget is spent,
+    decisions get no simulations
+
+    Elimination is a heuristic: confidence radii plug the sample variance in a
+    Gaussian-like bound (see `_radius`), so `confidence` is not a guaranteed
+    error probability, e.g. for a few heavy-tailed lengths
+    """
+
+    def __init__(self, budget, quota, max_quota, confidence=0.05, min_pairs=5):
+        """Class constructor
+
+        Parameters:
+            budget: max simulations ("yes" and "no") in total
+            quota: simulation pairs per decision
+            max_quota: max simulation pairs per decision, bank included
+            confidence: nominal error probability of `eliminated` (heuristic, see `_radius`)
+            min_pairs: simulation pairs before an arm may be eliminated
+        """
+        self._remaining = budget
+        self._quota = quota
+        self._max_quota = max_quota
+        self._confidence = confidence
+        self._min_pairs = min_pairs
+        self._bank = 0
+
+    def allowance(self):
+        """Returns the max simulation pairs for the next decision"""
+        return max(0, min(self._quota + self._bank // 2, self._max_quota, self._remaining // 2))
+
+    def spend(self, simulations):
+        """Records the simulations run by a decision"""
+        self._remaining = self._remaining - simulations
+        self._bank = max(0, self._bank + 2 * self._quota - simulations)
+
+    def remaining(self):
+        return self._remaining
+
+    def _radius(self, arm):
+        """Returns a heuristic confidence radius of an arm mean
+
+        The sub-Gaussian anytime radius with the sample variance plugged in for
+        the unknown one. Without a range term (empirical Bernstein), it is not a
+        guaranteed bound: lengths range is not known beforehand
+        """
+        count = arm.count()
+
+        return math.sqrt(2.0 * arm.variance() * math.log(4.0 * count * count / self._confidence) / count)
+
+    def eliminated(self, yes, no):
+        """Returns True if the confidence intervals of "yes" and "no" mean lengths are apart
+
+        Successive elimination between two arms: once one of them is eliminated,
+        the decision is settled
+        """
+        if yes.count() < self._min_pairs or no.count() < self._min_pairs:
+            return False
+
+        return abs(yes.mean() - no.mean()) > self._radius(yes) + self._radius(no)
+
 class BinaryMCSCWSSolver(clarke_wright.ClarkeWrightSolver):
     """BinaryMCS-CWS algorithm solver class"""
 
-    def __init__(self):
+    ROLLOUT_MODES = ['copy', 'trail']
+
+    def __init__(self, reference=False, rollout_mode='copy', neighbours=None, savings_threshold=None, rollouts=50,
+                 significance=None, min_rollouts=10, common_random_numbers=False, seed=None, processes=1,
+                 table_entries=None, rollout_budget=None, confidence=0.05):
+        """Initialize class
+
+        Parameters:
+            reference: if True, simulations clone the solution on every processed
+                pair (ClarkeWrightSolution.process) instead of using SavingsConstruction
+            rollout_mode: 'copy' starts every simulation from a new SavingsConstruction;
+                'trail' runs all simulations on a single SavingsConstruction, rewinding
+                its merges after each one (ignored in reference mode)
+            neighbours, savings_threshold: granular savings list (see ClarkeWrightSolver)
+            rollouts: max "yes" (and "no") simulations per merge decision
+            significance: if given, a decision stops sampling once a Welch t test
+                separates "yes" and "no" mean lengths at this significance level,
+                after at least `min_rollouts` (see `compare_rollouts`)
+            common_random_numbers: if True, each "yes" simulation and its matching "no"
+                simulation draw from the same random stream, seeded from `seed`
+                (see `rollout_seeds`), instead of the global `random` module
+            processes: if not 1, simulations are split among this many worker processes
+                (None: CPU count), sharing `data` arrays (see shared.SharedInstance).
+                Implies common random numbers; workers always use 'trail' rollouts
+            table_entries: if given, simulation statistics are cached by state (see
+                TranspositionTable and SavingsConstruction.state_hash), for up to this
+                many states. A decision reaching a cached state only runs the simulations
+                it is missing. Not used with worker processes
+            rollout_budget: if given, max simulations per solve, handed out to decisions
+                by a RolloutScheduler: each decision stops sampling once an arm is
+                eliminated at `confidence` level (a heuristic, see RolloutScheduler),
+                leaving its unused `rollouts` to harder decisions (up to 4 times
+                `rollouts`)
+        """
+        super(BinaryMCSCWSSolver, self).__init__(reference, neighbours, savings_threshold)
+
+        if rollout_mode not in self.ROLLOUT_MODES:
+            raise Exception('Invalid rollout mode {}. Expected one of {}'.format(rollout_mode, self.ROLLOUT_MODES))
+
         self._best = None
+        self._rollout_mode = rollout_mode
+        self._rollouts = rollouts
+        self._significance = significance
+        self._min_rollouts = min_rollouts
+        self._rollout_count = 0
+        self._common_random_numbers = common_random_numbers or processes != 1
+        self._seed = seed
+        self._random = None
+        self._processes = processes
+        self._executor = None
+        self._table_entries = table_entries
+        self._table = None
+        self._rollout_budget = rollout_budget
+        self._confidence = confidence
+        self._scheduler = None
+        self._on_improvement = None
+        self._stopped = False
+
+    def transposition_table(self):
+        """Returns the TranspositionTable of the last solve, or None"""
+        return self._table
+
+    def rollout_count(self):
+        """Returns the number of simulations run by the last solve"""
+        return self._rollout_count
+
+    def _improve(self, solution):
+        """Makes `solution` the best one found, reporting it to the improvement callback (see `incumbents`)"""
+        self._best = solution
+
+        if self._on_improvement is not None:
+            self._on_improvement(solution)
+
+    def rollout_limit(self):
+        """Returns the max simulation pairs of the next decision"""
+        if self._scheduler is None:
+            return self._rollouts
+
+        return self._scheduler.allowance()
+
+    def rollout_seeds(self, limit):
+        """Returns the seeds of a decision `limit` simulation pairs, or None without common random numbers
+
+        Seeds are drawn for all pairs, even if sampling stops earlier, so every
+        decision uses the same seeds whatever the number of processes
+        """
+        if not self._common_random_numbers:
+            return None
+
+        return [self._random.getrandbits(64) for _ in range(limit)]
+
+    def _separated(self, yes, no):
+        """Returns True if the decision is settled: the significance test separates
+        "yes" and "no" mean lengths, or the scheduler eliminated an arm
+        """
+        if self._scheduler is not None and self._scheduler.eliminated(yes, no):
+            return True
+
+        if self._significance is None or yes.count() < self._min_rollouts:
+            return False
+
+        critical = statistics.NormalDist().inv_cdf(1 - self._significance / 2.0)
+
+        return abs(sampling.welch_t(yes, no)) > critical
+
+    def _spend(self, simulations):
+        """Records the simulations run by a decision"""
+        self._rollout_count = self._rollout_count + simulations
+
+        if self._scheduler is not None:
+            self._scheduler.spend(simulations)
+
+    def compare_rollouts(self, yes_rollout, no_rollout, start, timeout, keys=None):
+        """Runs pairs of "yes" and "no" simulations (functions of a random generator, returning a length)
 
-    def simulation(self, solution, pair, savings_list):
-        """Do a Monte Carlo Simulation"""
+        Sampling stops after `rollout_limit` pairs, at `timeout` or, with a significance
+        level, as soon as the mean lengths differ significantly. The test is repeated
+        after every pair, so the actual error rate is higher than `significance`
+
+        With common random numbers, both simulations of pair r draw from
+        random.Random(seeds[r]) (see `rollout_seeds`); otherwise, from the global
+        `random` module
+
+        With `keys`, the ("yes", "no") states hashes, statistics are taken from and
+        added to the transposition table: only missing simulations are run
+
+        Returns True if "yes" simulations mean length is not longer than "no" one
+        """
+        limit = self.rollout_limit()
+        seeds = self.rollout_seeds(limit)
+
+        if keys is None or self._table is None:
+            yes = sampling.RunningStatistics()
+            no = sampling.RunningStatistics()
+        else:
+            yes = self._table.statistics(keys[0])
+            no = self._table.statistics(keys[1])
+
+        simulations = 0
+
+        for r in range(limit): # simulations
+            if yes.count() >= limit and no.count() >= limit:
+                break
+
+            for arm, rollout in [(yes, yes_rollout), (no, no_rollout)]:
+                if arm.count() < limit:
+                    arm.add(rollout(random if seeds is None else random.Random(seeds[r])))
+                    simulations = simulations + 1
+
+            if time.time() - start > timeout:
+                break
+
+            if self._separated(yes, no):
+                break
+
+        self._spend(simulations)
+
+        # Same as comparing means, without rounding (arms may have different sizes)
+        return yes.total() * no.count() <= no.total() * yes.count()
+
+    def parallel_rollouts(self, data, vehicles, routes, pair, start, timeout):
+        """Runs the simulations of `compare_rollouts` on the worker processes
+
+        Parameters:
+            routes: decision state, as lists of node ids
+            pair: candidate pair of node ids
+
+        Pairs are split in batches, one per worker. With a significance level or a
+        rollout budget, batches are small and the decision is checked after each
+        round of batches.
+        Results are reduced in pairs order, so without a significance level the
+        decision is the same as with a single process
+
+        Returns True if "yes" simulations were not longer than "no" ones
+        """
+        processes = self._processes or multiprocessing.cpu_count()
+        seeds = self.rollout_seeds(self.rollout_limit())
+
+        if self._significance is None and self._scheduler is None:
+            batch = int(math.ceil(len(seeds) / float(processes)))
+        else:
+            batch = max(1, int(math.ceil(self._min_rollouts / float(processes))))
+
+        settings = (self._neighbours, self._savings_threshold)
+
+        yes = sampling.RunningStatistics()
+        no = sampling.RunningStatistics()
+
+        position = 0
+
+        while position < len(seeds) and time.time() - start <= timeout and not self._separated(yes, no):
+            pending = []
+
+            for _ in range(processes):
+                if position < len(seeds):
+                    pending.append(self._executor.submit(_rollouts, settings, vehicles, routes, pair,
+                                                         seeds[position:position + batch], start, timeout))
+                    position = position + batch
+
+            for future in pending:
+                yes_lengths, no_lengths, best = future.result()
+
+                for yes_length, no_length in zip(yes_lengths, no_lengths):
+                    yes.add(yes_length)
+                    no.add(no_length)
+
+                if best is not None and (self._best is None or best[1] < self._best.length()):
+                    self._improve(BinaryMCSCWSSolution.from_routes(data, vehicles, best[0]))
+
+        self._spend(yes.count() + no.count())
+
+        return yes.total() <= no.total()
+
+    def simulation(self, solution, pair, savings_list, rng=random):
+        """Do a Monte Carlo Simulation, drawing from `rng`
+
+        `solution` is not changed
+        """
+        if self._reference:
+            return self._reference_simulation(solution.clone(), savings_list, rng)
+
+        construction = SavingsConstruction.from_solution(solution)
+
+        for i, j in savings_list.pairs():
+            if not construction.has_feasible_merge():
+                break
+
+            if rng.random() > rng.uniform(0.05, 0.4):
+                construction.merge(i, j)
+
+        if construction.is_complete() and (self._best is None or construction.length() < self._best.length()):
+            self._improve(construction.to_solution(BinaryMCSCWSSolution))
+
+        return construction.length()
+
+    def trail_simulation(self, construction, savings_list, rng=random):
+        """Do a Monte Carlo Simulation on `construction`, rewinding it afterwards, drawing from `rng`"""
+        mark = construction.mark()
+
+        for i, j in savings_list.pairs():
+            if not construction.has_feasible_merge():
+                break
+
+            if rng.random() > rng.uniform(0.05, 0.4):
+                construction.merge(i, j)
+
+        length = construction.length()
+
+        if construction.is_complete() and (self._best is None or length < self._best.length()):
+            self._improve(construction.to_solution(BinaryMCSCWSSolution))
+
+        construction.undo(mark)
+
+        return length
+
+    def _reference_simulation(self, solution, savings_list, rng=random):
+        """Do a Monte Carlo Simulation processing (cloning) one savings pair at a time"""
         for i, j in savings_list:
+            if not solution.has_feasible_merge():
+                break
+
             if solution.can_process((i, j)):
-                if random.random() > random.uniform(0.05, 0.4):
+                if rng.random() > rng.uniform(0.05, 0.4):
                     solution, inserted = solution.process((i, j))
 
         if self._best is None and solution.is_complete():
-            self._best = solution
+            self._improve(solution)
         elif solution.is_complete() and (solution.length() < self._best.length()):
-            self._best = solution
+            self._improve(solution)
 
         return solution.length()
 
+    def incumbents(self, data, vehicles, timeout, target=None):
+        """Yields each complete solution better than the previous ones, as soon as it is found
+
+        `solve` runs in a background thread, reporting improvements (see `_improve`).
+        Once the target is reached, or the caller stops iterating, the solve stops
+        after its current decision
+
+        See BaseSolver.incumbents
+        """
+        start = time.time()
+        improvements = queue.Queue()
+        errors = []
+
+        def run():
+            try:
+                improvements.put(self.solve(data, vehicles, timeout))
+            except Exception as error:
+                errors.append(error)
+                improvements.put(None)
+
+        self._on_improvement = lambda solution: improvements.put((solution, self._rollout_count))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+
+        best = None
+
+        try:
+            while True:
+                item = improvements.get()
+
+                if not isinstance(item, tuple):
+                    break
+
+                solution, iteration = item
+
+                if solution.is_complete() and (best is None or solution.length() < best.length()):
+                    best = solution
+
+                    yield Incumbent(best, best.length(), time.time() - start, iteration)
+
+                    if target is not None and best.length() <= target:
+                        return
+
+            if errors:
+                raise errors[0]
+
+            if best is None:
+                # No complete solution: reports the solve result, as BaseSolver.incumbents
+                yield Incumbent(item, item.length(), time.time() - start, self._rollout_count)
+        finally:
+            self._stopped = True
+            thread.join()
+
+            self._stopped = False
+            self._on_improvement = None
+
     def solve(self, data, vehicles, timeout):
         """Solves the CVRP problem using BinaryMCS-CWS method
 
@@ -39,6 +487,36 @@ class BinaryMCSCWSSolver(clarke_wright.ClarkeWrightSolver):
 
         Returns a solution (BinaryMCSCWSSolution class))
         """
+        self._rollout_count = 0
+        self._random = random.Random(self._seed)
+
+        self._table = None
+        if self._table_entries is not None:
+            self._table = TranspositionTable(self._table_entries)
+
+        self._scheduler = None
+        if self._rollout_budget is not None:
+            self._scheduler = RolloutScheduler(self._rollout_budget, self._rollouts, 4 * self._rollouts,
+                                               self._confidence)
+
+        if self._processes == 1:
+            return self._solve(data, vehicles, timeout)
+
+        with shared.SharedInstance(data, self.uses_savings()) as instance:
+            self._executor = futures.ProcessPoolExecutor(max_workers=self._processes, initializer=shared.init_worker,
+                                                         initargs=(instance.descriptor(),))
+
+            try:
+                return self._solve(data, vehicles, timeout)
+            finally:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _solve(self, data, vehicles, timeout):
+        """Solves the CVRP problem with the configured rollout mode"""
+        if self._rollout_mode == 'trail' and not self._reference:
+            return self._solve_trail(data, vehicles, timeout)
+
         start = time.time()
         savings_list = self.compute_savings_list(data)
 
@@ -48,7 +526,7 @@ class BinaryMCSCWSSolver(clarke_wright.ClarkeWrightSolver):
         savings_copy = savings_list[:]
 
         for i, j in savings_list:
-            if solution.is_complete():
+            if solution.is_complete() or not solution.has_feasible_merge():
                 break
 
             if solution.can_process((i, j)):
@@ -57,25 +535,116 @@ class BinaryMCSCWSSolver(clarke_wright.ClarkeWrightSolver):
                 if not inserted:
                     continue
 
-                yes = 0
-                no = 0
-
-                for r in range(50): # simulations
-                    yes = yes + self.simulation(processed.clone(), (i, j), savings_copy)
-                    no = no + self.simulation(solution.clone(), (i, j), savings_copy)
+                if self._executor is not None:
+                    routes = [[node.name() for node in route.nodes()] for route in solution.routes()]
+                    better = self.parallel_rollouts(data, vehicles, routes, (i.name(), j.name()), start, timeout)
+                else:
+                    keys = None
+                    if self._table is not None:
+                        keys = (SavingsConstruction.from_solution(processed).state_hash(),
+                                SavingsConstruction.from_solution(solution).state_hash())
 
-                    if time.time() - start > timeout:
-                        break
+                    better = self.compare_rollouts(lambda rng: self.simulation(processed, (i, j), savings_copy, rng),
+                                                   lambda rng: self.simulation(solution, (i, j), savings_copy, rng),
+                                                   start, timeout, keys)
 
-                if yes <= no:
+                if better:
                     solution = processed
 
-            if time.time() - start > timeout:
+            if time.time() - start > timeout or self._stopped:
                 break
 
         if self._best is None and solution.is_complete():
-            self._best = solution
+            self._improve(solution)
         elif solution.is_complete() and solution.length() < self._best.length():
-            self._best = solution
+            self._improve(solution)
 
         return self._best
+
+    def _solve_trail(self, data, vehicles, timeout):
+        """Solves the CVRP problem using BinaryMCS-CWS method with 'trail' rollouts
+
+        Decisions and simulations share a single SavingsConstruction: a simulation
+        from the "yes" state merges the candidate pair, runs and rewinds to the
+        decision point, so no solution is copied
+        """
+        start = time.time()
+        savings_list = self.compute_savings_list(data)
+
+        construction = SavingsConstruction(data, vehicles)
+        self._best = construction.to_solution(BinaryMCSCWSSolution)
+
+        for i, j in savings_list.pairs():
+            if construction.is_complete() or not construction.has_feasible_merge():
+                break
+
+            if construction.can_merge(i, j):
+                if self._executor is not None:
+                    better = self.parallel_rollouts(data, vehicles, construction.routes(), (i, j), start, timeout)
+                else:
+                    keys = None
+                    if self._table is not None:
+                        mark = construction.mark()
+                        construction.merge(i, j)
+                        keys = (construction.state_hash(),)
+                        construction.undo(mark)
+                        keys = keys + (construction.state_hash(),)
+
+                    better = self.compare_rollouts(
+                        lambda rng: _trail_rollout(self, construction, (i, j), savings_list, rng),
+                        lambda rng: self.trail_simulation(construction, savings_list, rng), start, timeout, keys)
+
+                if better:
+                    construction.merge(i, j)
+
+            if time.time() - start > timeout or self._stopped:
+                break
+
+        if construction.is_complete() and construction.length() < self._best.length():
+            self._improve(construction.to_solution(BinaryMCSCWSSolution))
+
+        return self._best
+
+def _trail_rollout(solver, construction, pair, savings_list, rng):
+    """Runs a "yes" simulation: merges `pair`, simulates and rewinds `construction`"""
+    mark = construction.mark()
+    construction.merge(*pair)
+    length = solver.trail_simulation(construction, savings_list, rng)
+    construction.undo(mark)
+
+    return length
+
+def _rollouts(settings, vehicles, routes, pair, seeds, start, timeout):
+    """Runs a batch of "yes" and "no" simulation pairs in a worker process
+
+    See BinaryMCSCWSSolver.parallel_rollouts
+
+    Returns a tuple (yes lengths, no lengths, best), best being the best complete
+    solution found, a tuple (routes, length), or None
+    """
+    data = shared.worker_data()
+
+    if settings not in _worker_solvers:
+        solver = BinaryMCSCWSSolver(rollout_mode='trail', neighbours=settings[0], savings_threshold=settings[1])
+        _worker_solvers[settings] = (solver, solver.compute_savings_list(data))
+
+    solver, savings_list = _worker_solvers[settings]
+    solver._best = None
+
+    construction = SavingsConstruction.from_solution(BinaryMCSCWSSolution.from_routes(data, vehicles, routes))
+
+    yes_lengths = []
+    no_lengths = []
+
+    for seed in seeds:
+        yes_lengths.append(_trail_rollout(solver, construction, pair, savings_list, random.Random(seed)))
+        no_lengths.append(solver.trail_simulation(construction, savings_list, random.Random(seed)))
+
+        if time.time() - start > timeout:
+            break
+
+    best = None
+    if solver._best is not None:
+        best = ([[node.name() for node in route.nodes()] for route in solver._best.routes()], solver._best.length())
+
+    return yes_lengths, no_lengths, best
@@ -1,96 +1,167 @@
 #!/bin/env python
 # -*- coding: utf-8 -*-
 
-import operator
 import time
 
 from project import models
 
 from project.solvers.base import BaseSolution, BaseSolver
+from project.solvers.construction import SavingsConstruction
+from project.solvers import savings
 
 class ClarkeWrightSolution(BaseSolution):
-    """Solution class for a Clarke and Wright Savings parallel algorithm"""
+    """Solution class for a Clarke and Wright Savings parallel algorithm
+
+    Solutions share their state with their clones: routes are never changed once
+    created (a merge builds a new route) and nodes are the problem ones. Routes
+    (by the id of their first node, which a merge keeps) and the node allocation
+    (node id -> route) are versioned arrays (see models.VersionedArray), so
+    clone() is O(1) and processing a pair is O(merged route)
+    """
 
     def __init__(self, cvrp_problem, vehicles):
         super(ClarkeWrightSolution, self).__init__(cvrp_problem, vehicles)
 
         self._vehicles = vehicles
-        self._routes = [models.Route(cvrp_problem, cvrp_problem.capacity()) for _ in range(len(self._nodes) - 1)]
+        self._nodes = {node.name(): node for node in cvrp_problem.nodes()}
+
+        # A route can only be merged if its demand leaves room for at least the
+        # smallest customer demand: "open" routes are counted to stop early
+        demands = [node.demand() for node in self._nodes.values() if node != cvrp_problem.depot()]
+        self._open_demand = cvrp_problem.capacity() - min(demands) if demands else cvrp_problem.capacity()
+
+        self._set_routes([[node] for node in self._nodes.values() if node != cvrp_problem.depot()])
+
+    def _set_routes(self, routes):
+        """Replaces all routes by `routes`, a list of (non empty) lists of nodes"""
+        capacity = self._problem.capacity()
+
+        routes = [models.Route.from_nodes(self._problem, capacity, nodes) for nodes in routes if nodes]
+        slots = [None] * (max(self._nodes) + 1)
+        allocation = [None] * len(slots)
+
+        for route in routes:
+            slots[_slot(route)] = route
+
+            for node in route.nodes():
+                allocation[node.name()] = route
+
+        self._routes = models.VersionedArray(slots)
+        self._allocation = models.VersionedArray(allocation)
+        self._route_count = len(routes)
 
-        for i, node in enumerate([node for node in self._nodes.values() if node != cvrp_problem.depot()]):
-            self._routes[i].allocate([node])
+        self._allocated = sum([len(route) for route in routes])
+        self._overloaded = len([route for route in routes if route.demand() > route.capacity()])
+        self._open = len([route for route in routes if route.demand() <= self._open_demand])
+        self._length = sum([route.length() for route in routes])
+
+    @classmethod
+    def from_routes(cls, cvrp_problem, vehicles, routes):
+        """Returns a new solution with `routes`, a list of lists of node ids"""
+        new_solution = cls(cvrp_problem, vehicles)
+        new_solution._set_routes([[new_solution._nodes[name] for name in route] for route in routes])
+
+        return new_solution
 
     def clone(self):
-        """Returns a deep copy of self
+        """Returns a copy of self, sharing state until any of them is changed
 
-        Clones:
+        Shares:
             routes
             allocation
             nodes
         """
+        new_solution = self.__class__.__new__(self.__class__)
+        new_solution.__dict__.update(self.__dict__)
 
-        new_solution = self.__class__(self._problem, self._vehicles)
+        return new_solution
 
-        # Clone routes
-        for index, r in enumerate(self._routes):
-            new_route = new_solution._routes[index] = models.Route(self._problem, self._problem.capacity())
-            for node in r.nodes():
-                # Insere new node on new route
-                new_node = new_solution._nodes[node.name()]
-                new_route.allocate([new_node])
+    def routes(self):
+        """Returns a generator for iterating over solution routes"""
+        for route in self._routes:
+            if route is not None:
+                yield route
 
-        return new_solution
+    def compute_length(self):
+        """Computes the solution length from scratch (see models.CHECK_COSTS)"""
+        return sum([route.compute_length() for route in self.routes()])
+
+    def route_allocation(self, node):
+        """Returns the route which node is allocated in this solution"""
+        return self._allocation.get(node.name())
+
+    def length(self):
+        """Returns the solution length (or cost), maintained on every merge"""
+        if models.CHECK_COSTS:
+            models.check_cost(self._length, self.compute_length())
+
+        return self._length
 
     def is_complete(self):
-        """Returns True if this is a complete solution, i.e, all nodes are allocated"""
-        allocated = all(
-            [node.route_allocation() is not None for node in self._nodes.values() if node != self._problem.depot()]
-        )
+        """Returns True if this is a complete solution, i.e, all nodes are allocated
+
+        O(1), from counters maintained on every change
+        """
+        allocated = self._allocated == len(self._nodes) - 1
 
-        valid_routes = len(self._routes) == self._vehicles
+        valid_routes = self._route_count == self._vehicles
 
-        valid_demands = all([route.demand() <= route.capacity() for route in self._routes])
+        valid_demands = self._overloaded == 0
 
         return allocated and valid_routes and valid_demands
 
+    def route_count(self):
+        """Returns the current number of routes"""
+        return self._route_count
+
+    def has_feasible_merge(self):
+        """Returns False if no pair of routes can be merged anymore, in O(1)
+
+        A True result does not assure a merge exists, only that it may exist
+        """
+        return self._open >= 2
+
+    def _merge(self, first, second):
+        """Replaces routes `first` and `second` by a route visiting both, in this order
+
+        Builds new versions of shared state (see models.VersionedArray), in O(merged route)
+        """
+        route = first.joined(second)
+
+        self._routes = self._routes.update([(_slot(first), route), (_slot(second), None)])
+        self._allocation = self._allocation.update([(node.name(), route) for node in route.nodes()])
+        self._route_count = self._route_count - 1
+
+        merged_open = (first.demand() <= self._open_demand) + (second.demand() <= self._open_demand)
+        self._open = self._open - merged_open + (route.demand() <= self._open_demand)
+        self._length = self._length - first.length() - second.length() + route.length()
+
     def process(self, pair):
         """Processes a pair of nodes into the current solution
 
         MUST CREATE A NEW INSTANCE, NOT CHANGE ANY INSTANCE ATTRIBUTES
 
-        Returns a new instance (deep copy) of self object
+        Returns a new instance (sharing unchanged state with self) and whether the pair was inserted
         """
-        a, b = pair
-
         new_solution = self.clone()
 
-        i, j = new_solution.get_pair((a, b))
+        i, j = new_solution.get_pair(pair)
 
-        route_i = i.route_allocation()
-        route_j = j.route_allocation()
+        route_i = new_solution.route_allocation(i)
+        route_j = new_solution.route_allocation(j)
 
         inserted = False
 
-        if ((route_i is not None and route_j is not None) and (route_i != route_j)):
-            if route_i._nodes.index(i) == 0 and route_j._nodes.index(j) == len(route_j._nodes) - 1:
-                if route_j.can_allocate(route_i._nodes):
-                    route_j.allocate(route_i._nodes)
-
-                    if i.route_allocation() != j.route_allocation():
-                        raise Exception('wtf')
-
+        if ((route_i is not None and route_j is not None) and (route_i is not route_j)):
+            if route_i.first(i) and route_j.last(j):
+                if route_j.demand() + route_i.demand() <= route_j.capacity():
+                    new_solution._merge(route_j, route_i)
                     inserted = True
-            elif route_j._nodes.index(j) == 0 and route_i._nodes.index(i) == len(route_i._nodes) - 1:
-                if route_i.can_allocate(route_j._nodes):
-                    route_i.allocate(route_j._nodes)
-
-                    if i.route_allocation() != j.route_allocation():
-                        raise Exception('wtf j')
-
+            elif route_j.first(j) and route_i.last(i):
+                if route_i.demand() + route_j.demand() <= route_i.capacity():
+                    new_solution._merge(route_i, route_j)
                     inserted = True
 
-        new_solution._routes = [route for route in new_solution._routes if route._nodes]
-
         return new_solution, inserted
 
     def can_process(self, pairs):
@@ -105,34 +176,53 @@ class ClarkeWrightSolution(BaseSolution):
         if i.route_allocation() is None or j.route_allocation() is None:
             return True
 
-        if self._allocated == len(list(self._problem.nodes())) - 1: # All nodes in a route
+        if self._allocated == len(self._nodes) - 1: # All nodes in a route
             return False
 
         return False
 
+def _slot(route):
+    """Returns the routes array index of `route`: its first node id"""
+    return next(route.nodes()).name()
+
 class ClarkeWrightSolver(BaseSolver):
     """Clark and Wright Savings algorithm solver class"""
-    def compute_savings_list(self, data):
-        """Compute Clarke and Wright savings list
 
-        A saving list is a matrix containing the saving amount S between i and j
+    def __init__(self, reference=False, neighbours=None, savings_threshold=None):
+        """Initialize class
 
-        S is calculated by S = d(0,i) + d(0,j) - d(i,j) (CLARKE; WRIGHT, 1964)
+        Parameters:
+            reference: if True, solutions are built by cloning on every processed
+                pair (ClarkeWrightSolution.process) instead of SavingsConstruction
+            neighbours: if given, savings list starts with pairs among the
+                `neighbours` nearest customers only (granular savings list)
+            savings_threshold: if given, savings list starts with pairs whose saving
+                is at least `savings_threshold` (granular savings list)
         """
+        super(ClarkeWrightSolver, self).__init__()
 
-        savings_list = {}
+        self._reference = reference
+        self._neighbours = neighbours
+        self._savings_threshold = savings_threshold
 
-        for i, j in data.edges():
-            t = (i, j)
+    def uses_savings(self):
+        """Returns False if savings lists are granular (see BaseSolver.uses_savings)"""
+        return self._neighbours is None and self._savings_threshold is None
 
-            if i == data.depot() or j == data.depot():
-                continue
+    def compute_savings_list(self, data):
+        """Compute Clarke and Wright savings list
+
+        A saving list is a matrix containing the saving amount S between i and j
 
-            savings_list[t] = data.distance(data.depot(), i) + data.distance(data.depot(), j) - data.distance(i, j)
+        S is calculated by S = d(0,i) + d(0,j) - d(i,j) (CLARKE; WRIGHT, 1964)
 
-        sorted_savings_list = sorted(savings_list.items(), key=operator.itemgetter(1), reverse=True)
+        Computed over the whole distance matrix at once (see CVRPData.savings_order),
+        or granular if solver has neighbours or savings_threshold (see
+        savings.granular_savings_order)
 
-        return [nodes for nodes, saving in sorted_savings_list]
+        Returns a SavingsList
+        """
+        return savings.compute_savings_list(data, self._neighbours, self._savings_threshold)
 
     def solve(self, data, vehicles, timeout):
         """Solves the CVRP problem using Clarke and Wright Savings methods
@@ -146,20 +236,37 @@ class ClarkeWrightSolver(BaseSolver):
         """
         savings_list = self.compute_savings_list(data)
 
+        if self._reference:
+            return self._solve_reference(data, vehicles, timeout, savings_list)
+
+        construction = SavingsConstruction(data, vehicles)
+
+        start = time.time()
+
+        for i, j in savings_list.pairs():
+            if construction.is_complete() or not construction.has_feasible_merge():
+                break
+
+            construction.merge(i, j)
+
+            if time.time() - start > timeout:
+                break
+
+        return construction.to_solution(ClarkeWrightSolution)
+
+    def _solve_reference(self, data, vehicles, timeout, savings_list):
+        """Solves the CVRP problem processing (cloning) one savings pair at a time"""
         solution = ClarkeWrightSolution(data, vehicles)
 
         start = time.time()
 
         for i, j in savings_list[:]:
-            if solution.is_complete():
+            if solution.is_complete() or not solution.has_feasible_merge():
                 break
 
             if solution.can_process((i, j)):
                 solution, inserted = solution.process((i, j))
 
-                if inserted:
-                    savings_list.remove((i, j))
-
             if time.time() - start > timeout:
                 break
 
@@ -0,0 +1,243 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+_MASK_64 = (1 << 64) - 1
+
+def edge_hash(i, j):
+    """Returns a 64 bit pseudo random key for the edge from node id i to node id j (splitmix64)"""
+    z = (((i << 32) | j) + 0x9E3779B97F4A7C15) & _MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK_64
+
+    return z ^ (z >> 31)
+
+class SavingsConstruction(object):
+    """In-place Clarke and Wright savings construction
+
+    Routes are tracked with a union-find structure (union by size) over node
+    ids: each root keeps its route endpoints, demand and size, and every node its
+    successor in the route. Checking and applying a merge are O(log n), with no
+    solution copies; a solution object is only built by `to_solution`.
+
+    Merges follow ClarkeWrightSolution.process rules: a pair (i, j) joins two
+    different routes when i starts one of them and j ends the other, without
+    reversing any route, if capacity allows it
+
+    Every merge is recorded on a trail, so the construction can be rewound to
+    any earlier point (`mark` and `undo`) in time proportional to the merges undone
+
+    A Zobrist-style hash of the routes (see `state_hash`) is kept up to date by
+    merges and undos
+    """
+
+    def __init__(self, cvrp_problem, vehicles):
+        """Class constructor
+
+        Starts with one route per customer
+
+        Parameters:
+            cvrp_problem: CVRPData instance
+            vehicles: Vehicles number
+        """
+        self._problem = cvrp_problem
+        self._vehicles = vehicles
+        self._capacity = cvrp_problem.capacity()
+        self._depot = cvrp_problem.depot().name()
+
+        nodes = list(cvrp_problem.nodes())
+        size = max([node.name() for node in nodes]) + 1
+
+        self._parent = list(range(size))
+        self._size = [1] * size
+        self._first = list(range(size))
+        self._last = list(range(size))
+        self._demand = [0] * size
+        self._successor = [None] * size
+        self._customers = [node.name() for node in nodes if node.name() != self._depot]
+
+        distance = cvrp_problem.distance_by_id
+
+        self._length = 0
+
+        for node in nodes:
+            self._demand[node.name()] = node.demand()
+
+            if node.name() != self._depot:
+                self._length = self._length + 2 * distance(self._depot, node.name())
+
+        self._routes = len(self._customers)
+        self._trail = []
+        self._hash = 0
+
+        # A route can only be merged if its demand leaves room for at least the
+        # smallest customer demand: "open" routes are counted to stop early
+        demands = [self._demand[i] for i in self._customers]
+        self._open_demand = self._capacity - min(demands) if demands else self._capacity
+        self._open = len([demand for demand in demands if demand <= self._open_demand])
+
+    @classmethod
+    def from_solution(cls, solution):
+        """Returns a construction starting from the routes of a Clarke and Wright solution"""
+        construction = cls(solution._problem, solution._vehicles)
+
+        for route in solution.routes():
+            nodes = [node.name() for node in route.nodes()]
+
+            for name in nodes[1:]:
+                construction._join(construction.find(nodes[0]), construction.find(name))
+
+        construction._trail = []
+
+        return construction
+
+    def _is_open(self, root):
+        """Returns 1 if route `root` may still be merged with another route, 0 otherwise"""
+        return 1 if self._demand[root] <= self._open_demand else 0
+
+    def find(self, i):
+        """Returns the root (route identifier) of node id i"""
+        parent = self._parent
+
+        while parent[i] != i:
+            i = parent[i]
+
+        return i
+
+    def _join(self, a, b):
+        """Appends route with root b to the end of route with root a
+
+        Returns the saving
+        """
+        distance = self._problem.distance_by_id
+        depot = self._depot
+        last, first = self._last[a], self._first[b]
+
+        saving = distance(last, depot) + distance(depot, first) - distance(last, first)
+
+        self._successor[last] = first
+        self._hash = self._hash ^ edge_hash(last, first)
+
+        root, child = (a, b) if self._size[a] >= self._size[b] else (b, a)
+
+        self._trail.append((last, child, root, self._size[root], self._demand[root],
+                            self._first[root], self._last[root], saving))
+
+        self._parent[child] = root
+        self._size[root] = self._size[a] + self._size[b]
+        self._open = self._open - self._is_open(a) - self._is_open(b)
+        self._demand[root] = self._demand[a] + self._demand[b]
+        self._open = self._open + self._is_open(root)
+        self._first[root] = self._first[a]
+        self._last[root] = self._last[b]
+
+        self._routes = self._routes - 1
+        self._length = self._length - saving
+
+        return saving
+
+    def _orientation(self, i, j):
+        """Returns the roots (a, b) such that route a followed by route b joins pair (i, j)
+
+        Returns None if pair (i, j) can not be merged
+        """
+        a, b = self.find(i), self.find(j)
+
+        if a == b or self._demand[a] + self._demand[b] > self._capacity:
+            return None
+
+        if self._first[a] == i and self._last[b] == j:
+            return b, a
+        elif self._first[b] == j and self._last[a] == i:
+            return a, b
+
+        return None
+
+    def can_merge(self, i, j):
+        """Returns True if pair of node ids (i, j) can be merged"""
+        return self._orientation(i, j) is not None
+
+    def merge(self, i, j):
+        """Merges the routes of node ids i and j, if possible
+
+        Returns True if routes were merged
+        """
+        orientation = self._orientation(i, j)
+
+        if orientation is None:
+            return False
+
+        self._join(*orientation)
+
+        return True
+
+    def mark(self):
+        """Returns the current trail position, to be used with `undo`"""
+        return len(self._trail)
+
+    def undo(self, mark):
+        """Rewinds all merges made after trail position `mark`"""
+        trail = self._trail
+
+        while len(trail) > mark:
+            last, child, root, size, demand, first, root_last, saving = trail.pop()
+
+            self._hash = self._hash ^ edge_hash(last, self._successor[last])
+            self._successor[last] = None
+            self._parent[child] = child
+            self._size[root] = size
+            self._open = self._open - self._is_open(root)
+            self._demand[root] = demand
+            self._open = self._open + self._is_open(root) + self._is_open(child)
+            self._first[root] = first
+            self._last[root] = root_last
+
+            self._routes = self._routes + 1
+            self._length = self._length + saving
+
+    def is_complete(self):
+        """Returns True if the construction has as many routes as vehicles"""
+        return self._routes == self._vehicles
+
+    def has_feasible_merge(self):
+        """Returns False if no pair of routes can be merged anymore, in O(1)
+
+        A True result does not assure a merge exists, only that it may exist
+        """
+        return self._open >= 2
+
+    def length(self):
+        """Returns the current solution length (or cost)"""
+        return self._length
+
+    def state_hash(self):
+        """Returns the XOR of the `edge_hash` of every edge between customers
+
+        Constructions with the same routes (in the same direction) have the same hash,
+        whatever the merges order. Updated in O(1) by merges and undos
+        """
+        return self._hash
+
+    def route_count(self):
+        """Returns the current number of routes"""
+        return self._routes
+
+    def routes(self):
+        """Returns a list of routes, each one a list of node ids in visiting order"""
+        routes = []
+
+        for i in self._customers:
+            if self._parent[i] == i:
+                route = []
+                node = self._first[i]
+
+                while node is not None:
+                    route.append(node)
+                    node = self._successor[node]
+
+                routes.append(route)
+
+        return routes
+
+    def to_solution(self, solution_class):
+        """Builds a `solution_class` instance (ClarkeWrightSolution derived) with current routes"""
+        return solution_class.from_routes(self._problem, self._vehicles, self.routes())
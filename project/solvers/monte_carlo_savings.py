@@ -1,61 +1,26 @@
 #!/bin/env python
 # -*- coding: utf-8 -*-
 
-import operator
+import multiprocessing
+import queue
 import time
 
-import random
+from concurrent import futures
 
-from project import models
+import numpy
 
-from project.solvers.base import BaseSolver
+from project import shared
+from project.solvers.base import BaseSolver, Incumbent
 from project.solvers.clarke_wright import ClarkeWrightSolution
+from project.solvers.construction import SavingsConstruction
+from project.solvers import sampling, savings
+
+# Worker process queue of improving solutions and shared bound, see _init_worker
+_worker = {}
 
 class MonteCarloSavingsSolution(ClarkeWrightSolution):
     """Solution class for a Clarke and Wright Savings algorithm using Monte Carlo Savings algorithm (OLIVEIRA, 2014)"""
 
-    def __init__(self, cvrp_problem, vehicles):
-        super(MonteCarloSavingsSolution, self).__init__(cvrp_problem, vehicles)
-
-        self._vehicles = vehicles
-        self._routes = [models.Route(cvrp_problem, cvrp_problem.capacity()) for _ in range(len(self._nodes) - 1)]
-
-        for i, node in enumerate([node for node in self._nodes.values() if node != cvrp_problem.depot()]):
-            self._routes[i].allocate([node])
-
-    def clone(self):
-        """Returns a deep copy of self
-
-        Clones:
-            routes
-            allocation
-            nodes
-        """
-
-        new_solution = self.__class__(self._problem, self._vehicles)
-
-        # Clone routes
-        for index, r in enumerate(self._routes):
-            new_route = new_solution._routes[index] = models.Route(self._problem, self._problem.capacity())
-            for node in r.nodes():
-                # Insere new node on new route
-                new_node = new_solution._nodes[node.name()]
-                new_route.allocate([new_node])
-
-        return new_solution
-
-    def is_complete(self):
-        """Returns True if this is a complete solution, i.e, all nodes are allocated"""
-        allocated = all(
-            [node.route_allocation() is not None for node in self._nodes.values() if node != self._problem.depot()]
-        )
-
-        valid_routes = len(self._routes) == self._vehicles
-
-        valid_demands = all([route.demand() <= route.capacity() for route in self._routes])
-
-        return allocated and valid_routes and valid_demands
-
 class MonteCarloSavingsSolver(BaseSolver):
     """Monte Carlo Savings algorithm (OLIVEIRA, 2014) solver class"""
 
@@ -63,104 +28,558 @@ class MonteCarloSavingsSolver(BaseSolver):
     # problem file was ran 5 times
     DEFAULT_SIMULATIONS_PER_EXECUTION = 100
 
+    # Perturbed savings values generated at once (block of simulations x pairs),
+    # bounds memory used by compute_list_of_savings_list
+    MAX_BLOCK_VALUES = 2 ** 22
+
+    # Worker processes stop this fraction of the timeout earlier (at most
+    # MAX_WORKER_MARGIN seconds), so their results reach the parent in time
+    WORKER_MARGIN = 0.05
+    MAX_WORKER_MARGIN = 1.0
+
+    # Seconds between checks for incumbents streamed by worker processes
+    POLL_INTERVAL = 0.05
+
     default_lambda_p = 0.05
 
-    def __init__(self, lambda_p=None, *args, **kwargs):
+    def __init__(self, lambda_p=None, reference=False, neighbours=None, savings_threshold=None, seed=None,
+                 processes=1, pruning=True, improvement_threshold=None, min_simulations=10, *args, **kwargs):
+        """Initialize class
+
+        Parameters:
+            lambda_p: savings perturbation range, P is drawn from [-lambda_p, lambda_p]
+            reference: if True, solutions are built by cloning on every processed
+                pair (ClarkeWrightSolution.process) instead of SavingsConstruction
+            neighbours, savings_threshold: if any is given, only pairs of a granular
+                savings list are perturbed (see savings.granular_savings_order), then
+                larger granular lists are used as fallback (see savings.granular_fallback)
+            seed: perturbations seed (numpy.random.default_rng), makes solve reproducible
+                (for the same `processes`)
+            processes: simulations are split among this many worker processes (None:
+                CPU count), each one with its own seed stream (SeedSequence.spawn)
+            pruning: if True, a simulation is abandoned as soon as it can not beat the
+                best solution found so far (see `lower_bound`)
+            improvement_threshold: if given, simulations stop once the chance that any of
+                the remaining ones improves the best solution falls below it (see
+                `improvement_probability`), after at least `min_simulations`
+        """
         super(MonteCarloSavingsSolver, self).__init__()
 
         if lambda_p is None:
             lambda_p = self.default_lambda_p
 
         self._lambda_p = lambda_p
+        self._reference = reference
+        self._neighbours = neighbours
+        self._savings_threshold = savings_threshold
+        self._seed = seed
+        self._processes = processes
+        self._pruning = pruning
+        self._improvement_threshold = improvement_threshold
+        self._min_simulations = min_simulations
+
+        # Pairs the last construction went through, so the next savings list sorts
+        # about as many pairs at once (see savings.LazySavingsList)
+        self._sort_block = None
+
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        """Resets simulations statistics (see `statistics`)"""
+        self._statistics = {'simulations': 0, 'simulations_time': 0.0, 'pruned': 0, 'pruned_time': 0.0,
+                            'stopped': 0}
+
+    def statistics(self):
+        """Returns a dict of statistics since the last solve
+
+        simulations, pruned: number of simulations run to the end and pruned
+        simulations_time, pruned_time: seconds spent on each
+        stopped: simulations skipped by the improvement threshold
+        saved_time: estimated seconds saved by pruning, i.e. the time pruned simulations
+            would have taken to run to the end (on average) minus the time they took
+        """
+        statistics = dict(self._statistics)
+        statistics['saved_time'] = 0.0
 
-    def compute_list_of_savings_list(self, data):
-        """Compute Clarke and Wright savings list
+        if statistics['simulations']:
+            average = statistics['simulations_time'] / statistics['simulations']
+            statistics['saved_time'] = max(0.0, average * statistics['pruned'] - statistics['pruned_time'])
 
-        A saving list is a matrix containing the saving amount S between i and j
+        return statistics
 
-        S is calculated by S = d(0,i) + d(0,j) - d(i,j) + P
+    def improvement_probability(self, lengths, attempts, best, remaining):
+        """Returns the estimated chance that any of `remaining` simulations is shorter than `best`
 
-        Returns a list of savings list, ordered by total saving
+        Complete solutions lengths (`lengths`, a sampling.RunningStatistics) are
+        assumed normally distributed; out of `attempts` simulations, the others
+        (pruned or not complete) never improved. Lengths are integers, so a shorter
+        one is at most `best - 0.5` (also with no variance, e.g. all lengths equal)
         """
-        for r in range(self.DEFAULT_SIMULATIONS_PER_EXECUTION):
-            savings_list = {}
+        if not lengths.count():
+            return 1.0
 
-            total_savings = 0
+        shorter = sampling.normal_cdf(best - 0.5, lengths.mean(), lengths.std())
+        improvement = lengths.count() / float(attempts) * shorter
 
-            for i, j in data.edges():
-                t = (i, j)
+        return 1.0 - (1.0 - improvement) ** remaining
 
-                if i == data.depot() or j == data.depot():
-                    continue
+    def free_savings(self, data):
+        """Returns the sum of customers best savings over route ends of a new construction
 
-                p = random.uniform(-self._lambda_p, self._lambda_p)
+        Every customer is alone in its route, so it counts twice (see `lower_bound`)
+        """
+        best, prefix = savings.best_savings(data)
 
-                saving = data.distance(data.depot(), i) + data.distance(data.depot(), j) - data.distance(i, j)
-                saving = saving + (saving * p)
+        return 2 * int(prefix[-1])
 
-                total_savings = total_savings + saving
+    def lower_bound(self, data, vehicles, solution, free_savings):
+        """Returns a lower bound on the length of any complete solution built from `solution`
 
-                savings_list[t] = saving
+        Each of the m = routes - vehicles merges still needed links two route ends,
+        saving at most the best saving of either customer (unperturbed, see
+        savings.best_savings). So merges save at most:
+            - half the best savings over route ends (`free_savings`: a customer alone
+              in its route counts twice, a route end once), but the 2 * vehicles ends
+              left unlinked, at least the smallest best savings counted twice
+            - the m largest best savings, each customer being linked at most twice
+        """
+        merges = solution.route_count() - vehicles
 
-            sorted_savings_list = sorted(savings_list.items(), key=operator.itemgetter(1), reverse=True)
+        if merges <= 0:
+            return solution.length()
 
-            yield [nodes for nodes, saving_count in sorted_savings_list]
+        best, prefix = savings.best_savings(data)
+        customers = len(prefix) - 1
 
-    def solve(self, data, vehicles, timeout):
-        """Solves the CVRP problem using Monte Carlo Savings method (OLIVEIRA, 2014)
+        ends = (free_savings - 2 * int(prefix[min(vehicles, customers)])) // 2
+        largest = int(prefix[customers] - prefix[max(0, customers - merges)])
 
-        Parameters:
-            data: CVRPData instance
-            vehicles: Vehicles number
-            timeout: max processing time in seconds
+        return solution.length() - min(ends, largest)
 
-        Returns a solution (MonteCarloSavingsSolution class))
+    def uses_savings(self):
+        """Returns False if savings lists are granular (see BaseSolver.uses_savings)"""
+        return self._neighbours is None and self._savings_threshold is None
+
+    def base_savings(self, data):
+        """Returns base savings arrays (i, j, saving) to perturb, shared by all simulations
+
+        Every customers pair or, if granular, the granular pairs (see CVRPData.savings
+        and savings.granular_savings)
         """
-        start = time.time()
-        time_found = None
+        if self._neighbours is None and self._savings_threshold is None:
+            return data.savings()
 
-        best = MonteCarloSavingsSolution(data, vehicles)
-        best_feasible = best
+        return savings.granular_savings(data, self._neighbours, self._savings_threshold)
 
-        savings_lists = self.compute_list_of_savings_list(data)
+    def construct(self, data, vehicles, savings_list, start, timeout, incumbent=None):
+        """Builds a solution processing `savings_list` pairs in order
 
-        solution_lengths = 0
-        processed_count = 0
+        If `incumbent` (a length) is given, construction is abandoned as soon as its
+        lower bound reaches it (see `lower_bound`). The bound only reads per customer
+        arrays, so granular solvers never compute every pair saving for it
 
-        for savings_list in savings_lists:
+        Returns a MonteCarloSavingsSolution in reference mode, a SavingsConstruction
+        otherwise (see `materialize`), or None if pruned
+        """
+        if incumbent is not None:
+            best, prefix = savings.best_savings(data)
+            free = self.free_savings(data)
+
+        if self._reference:
             solution = MonteCarloSavingsSolution(data, vehicles)
 
             for i, j in savings_list[:]:
-                if solution.is_complete():
+                if solution.is_complete() or not solution.has_feasible_merge():
                     break
 
                 if solution.can_process((i, j)):
                     solution, inserted = solution.process((i, j))
 
+                    if inserted and incumbent is not None:
+                        free = free - int(best[i.name()]) - int(best[j.name()])
+
+                        if self.lower_bound(data, vehicles, solution, free) >= incumbent:
+                            return None
+
                 if time.time() - start > timeout:
                     break
 
+            return solution
+
+        construction = SavingsConstruction(data, vehicles)
+
+        pruned = False
+        depth = 0
+
+        for i, j in savings_list.pairs():
+            if construction.is_complete() or not construction.has_feasible_merge():
+                break
+
+            depth = depth + 1
+
+            if construction.merge(i, j) and incumbent is not None:
+                free = free - int(best[i]) - int(best[j])
+
+                if self.lower_bound(data, vehicles, construction, free) >= incumbent:
+                    pruned = True
+                    break
+
             if time.time() - start > timeout:
                 break
 
-            if solution.is_complete() and not best_feasible.is_complete():
-                best_feasible = solution
-            elif solution.is_complete() and solution.length() < best.length():
-                best_feasible = solution
-                best = solution
+        self._sort_block = depth + depth // 4 + 1
+
+        if pruned:
+            return None
+
+        return construction
+
+    def materialize(self, solution):
+        """Returns a MonteCarloSavingsSolution from a `construct` result"""
+        if isinstance(solution, SavingsConstruction):
+            return solution.to_solution(MonteCarloSavingsSolution)
+
+        return solution
+
+    def compute_list_of_savings_list(self, data):
+        """Compute Clarke and Wright savings list
+
+        A saving list is a matrix containing the saving amount S between i and j
+
+        S is calculated by S = d(0,i) + d(0,j) - d(i,j) + P
+
+        Returns a generator of savings lists (SavingsList), ordered by total saving
+
+        Perturbations for a block of simulations are drawn at once, and each
+        simulation list is sorted by its perturbed savings as it is iterated (see
+        savings.LazySavingsList; stable, so ties keep base savings order)
+        """
+        return self.perturbed_savings_lists(data, numpy.random.default_rng(self._seed),
+                                            self.DEFAULT_SIMULATIONS_PER_EXECUTION)
+
+    def perturbed_savings_lists(self, data, rng, simulations):
+        """Returns a generator of `simulations` perturbed savings lists drawn from `rng`
+
+        See compute_list_of_savings_list
+        """
+        savings_i, savings_j, base_savings = self.base_savings(data)
+        base_savings = base_savings.astype(numpy.float64)
+
+        fallback = None
+        if self._neighbours is not None or self._savings_threshold is not None:
+            fallback = savings.granular_fallback(data, self._neighbours, self._savings_threshold)
+
+        remaining = simulations
+        block_size = max(1, self.MAX_BLOCK_VALUES // max(1, len(base_savings)))
+
+        while remaining > 0:
+            block = min(block_size, remaining)
+            remaining = remaining - block
+
+            p = rng.uniform(-self._lambda_p, self._lambda_p, size=(block, len(base_savings)))
+            perturbed = base_savings + (base_savings * p)
+
+            for values in perturbed:
+                yield savings.LazySavingsList(data, savings_i, savings_j, values, fallback, self._sort_block)
+
+    def constructions(self, data, vehicles, savings_lists, start, timeout, budget=None):
+        """Yields a solution built from each savings list, until `timeout` (see `construct`)
+
+        If pruning, simulations which can not beat the best complete solution
+        yielded so far, or found by other solvers (see BaseSolver.share_bound), are
+        not yielded
+
+        `budget` is the number of savings lists (default: DEFAULT_SIMULATIONS_PER_EXECUTION),
+        used by the improvement threshold
+        """
+        if budget is None:
+            budget = self.DEFAULT_SIMULATIONS_PER_EXECUTION
+
+        best = None
+        lengths = sampling.RunningStatistics()
+        attempts = 0
+
+        for savings_list in savings_lists:
+            construction_start = time.time()
+
+            incumbent = None
+
+            if self._pruning:
+                incumbent = best
+                external = self.external_bound()
+
+                if external is not None and (incumbent is None or external < incumbent):
+                    incumbent = external
+
+            solution = self.construct(data, vehicles, savings_list, start, timeout, incumbent)
+
+            if time.time() - start > timeout:
+                break
+
+            attempts = attempts + 1
+
+            if solution is None:
+                self._statistics['pruned'] = self._statistics['pruned'] + 1
+                self._statistics['pruned_time'] = self._statistics['pruned_time'] + time.time() - construction_start
+            else:
+                self._statistics['simulations'] = self._statistics['simulations'] + 1
+                elapsed = time.time() - construction_start
+                self._statistics['simulations_time'] = self._statistics['simulations_time'] + elapsed
+
+                if solution.is_complete():
+                    lengths.add(solution.length())
+
+                    if best is None or solution.length() < best:
+                        best = solution.length()
+
+                yield solution
+
+            if self._improvement_threshold is not None and best is not None and attempts >= self._min_simulations:
+                remaining = budget - attempts
+
+                if self.improvement_probability(lengths, attempts, best, remaining) < self._improvement_threshold:
+                    self._statistics['stopped'] = remaining
+                    break
+
+    def simulate(self, data, vehicles, savings_lists, start, timeout, budget=None, on_improvement=None):
+        """Builds a solution for each savings list, until `timeout` (see `constructions` for `budget`)
+
+        `on_improvement(best, time_found)` is called whenever the best solution changes
+
+        Returns a tuple (best, best_feasible, time_found, processed_count, solution_lengths)
+        """
+        time_found = None
+
+        best = MonteCarloSavingsSolution(data, vehicles)
+        best_feasible = best
+
+        solution_lengths = 0
+        processed_count = 0
+
+        for solution in self.constructions(data, vehicles, savings_lists, start, timeout, budget):
+            # Pruned simulations are never better than `best`, so it must be taken from
+            # the first complete solution on
+            if solution.is_complete() and (not best.is_complete() or solution.length() < best.length()):
+                best_feasible = self.materialize(solution)
+                best = best_feasible
                 time_found = time.time() - start
 
+                if on_improvement is not None:
+                    on_improvement(best, time_found)
+
             processed_count = processed_count + 1
             solution_lengths = solution_lengths + solution.length()
 
+        return best, best_feasible, time_found, processed_count, solution_lengths
+
+    def worker_results(self, data, vehicles, start, timeout):
+        """Splits simulations among worker processes, sharing `data` arrays (see shared.SharedInstance)
+
+        Workers stream each improving solution as they find it, and stop a bit
+        before `timeout` (see WORKER_MARGIN) to report their totals. Yields a tuple
+        as `simulate` for each of them: streamed solutions count no simulations.
+        Anything not received by `timeout` is discarded
+        """
+        processes = self._processes or multiprocessing.cpu_count()
+        simulations = self.DEFAULT_SIMULATIONS_PER_EXECUTION
+
+        # Same split (and so the same seed streams) for the same processes number
+        sizes = [simulations // processes + (index < simulations % processes) for index in range(processes)]
+        sizes = [size for size in sizes if size]
+        seeds = numpy.random.SeedSequence(self._seed).spawn(len(sizes))
+
+        worker_timeout = timeout - min(self.WORKER_MARGIN * timeout, self.MAX_WORKER_MARGIN)
+
+        settings = (self._lambda_p, self._reference, self._neighbours, self._savings_threshold, self._pruning,
+                    self._improvement_threshold, self._min_simulations)
+
+        improvements = multiprocessing.Queue()
+
+        with shared.SharedInstance(data, self.uses_savings()) as instance:
+            executor = futures.ProcessPoolExecutor(max_workers=len(sizes), initializer=_init_worker,
+                                                   initargs=(instance.descriptor(), improvements, self._shared_bound))
+
+            try:
+                pending = set([executor.submit(_simulate, settings, vehicles, seed, size, start, worker_timeout)
+                               for seed, size in zip(seeds, sizes)])
+
+                while True:
+                    for result in self._streamed_results(data, vehicles, improvements):
+                        yield result
+
+                    remaining = timeout - (time.time() - start)
+
+                    if not pending or remaining <= 0:
+                        break
+
+                    done, pending = futures.wait(pending, timeout=min(remaining, self.POLL_INTERVAL),
+                                                 return_when=futures.FIRST_COMPLETED)
+
+                    for future in done:
+                        routes, feasible_routes, time_found, count, lengths, statistics = future.result()
+
+                        for key in self._statistics:
+                            self._statistics[key] = self._statistics[key] + statistics[key]
+
+                        yield (MonteCarloSavingsSolution.from_routes(data, vehicles, routes),
+                               MonteCarloSavingsSolution.from_routes(data, vehicles, feasible_routes),
+                               time_found, count, lengths)
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+                improvements.close()
+
+    def _streamed_results(self, data, vehicles, improvements):
+        """Yields the solutions received so far from workers (see `worker_results`)"""
+        while True:
+            try:
+                routes, time_found = improvements.get_nowait()
+            except queue.Empty:
+                return
+
+            solution = MonteCarloSavingsSolution.from_routes(data, vehicles, routes)
+
+            yield solution, solution, time_found, 0, 0
+
+    def simulate_parallel(self, data, vehicles, start, timeout):
+        """Runs simulations on worker processes (see `worker_results`), reducing their results
+
+        Returns a tuple as `simulate`
+        """
+        best = MonteCarloSavingsSolution(data, vehicles)
+        best_feasible = best
+        time_found = None
+
+        solution_lengths = 0
+        processed_count = 0
+
+        results = self.worker_results(data, vehicles, start, timeout)
+
+        for solution, feasible, worker_time_found, count, lengths in results:
+            processed_count = processed_count + count
+            solution_lengths = solution_lengths + lengths
+
+            if feasible.is_complete() and not best_feasible.is_complete():
+                best_feasible = feasible
+
+            for candidate in [solution, feasible]:
+                if candidate.is_complete() and (not best.is_complete() or candidate.length() < best.length()):
+                    best = best_feasible = candidate
+                    time_found = worker_time_found
+
+        return best, best_feasible, time_found, processed_count, solution_lengths
+
+    def incumbents(self, data, vehicles, timeout, target=None):
+        """Yields each complete solution better than the previous ones, as soon as it is found
+
+        With worker processes, incumbents are taken from the solutions workers stream
+
+        See BaseSolver.incumbents
+        """
+        start = time.time()
+        best = None
+
+        self.reset_statistics()
+
+        if self._processes == 1:
+            savings_lists = self.compute_list_of_savings_list(data)
+            results = ([solution] for solution in self.constructions(data, vehicles, savings_lists, start, timeout))
+        else:
+            results = ([solution, feasible] for solution, feasible, _, _, _ in self.worker_results(
+                data, vehicles, start, timeout))
+
+        iteration = 0
+
+        for candidates in results:
+            iteration = iteration + 1
+
+            for solution in candidates:
+                if solution.is_complete() and (best is None or solution.length() < best.length()):
+                    best = self.materialize(solution)
+
+                    yield Incumbent(best, best.length(), time.time() - start, iteration)
+
+                    if target is not None and best.length() <= target:
+                        return
+
+    def solve(self, data, vehicles, timeout):
+        """Solves the CVRP problem using Monte Carlo Savings method (OLIVEIRA, 2014)
+
+        Parameters:
+            data: CVRPData instance
+            vehicles: Vehicles number
+            timeout: max processing time in seconds
+
+        Returns a solution (MonteCarloSavingsSolution class))
+        """
+        start = time.time()
+
+        self.reset_statistics()
+
+        if self._processes == 1:
+            result = self.simulate(data, vehicles, self.compute_list_of_savings_list(data), start, timeout)
+        else:
+            result = self.simulate_parallel(data, vehicles, start, timeout)
+
+        best, best_feasible, time_found, processed_count, solution_lengths = result
+
         print('best solution found after {} seconds'.format(time_found))
 
-        if processed_count:
+        statistics = self.statistics()
+
+        # Pruned simulations stop before their solution is complete, so they have no length
+        if processed_count and statistics['pruned']:
+            print('average solution lengths: {} (over {} non-pruned simulations)'.format(
+                solution_lengths / float(processed_count), processed_count))
+        elif processed_count:
             print('average solution lengths: {}'.format(solution_lengths / float(processed_count)))
 
+        if self._pruning:
+            print('pruned simulations: {} (about {:.3f} seconds saved)'.format(
+                statistics['pruned'], statistics['saved_time']))
+
         if not best.is_complete():
             from project import util
             print('Best solution not feasible, printing best feasible found')
             util.print_solution(best_feasible)
 
         return best
+
+def _init_worker(descriptor, improvements, bound):
+    """Process pool initializer: attaches to the shared instance, keeps the improvements queue and shared bound
+
+    See MonteCarloSavingsSolver.worker_results and BaseSolver.share_bound
+    """
+    shared.init_worker(descriptor)
+
+    _worker['improvements'] = improvements
+    _worker['bound'] = bound
+
+def _route_ids(solution):
+    """Returns `solution` routes as lists of node ids"""
+    return [[node.name() for node in route.nodes()] for route in solution.routes()]
+
+def _simulate(settings, vehicles, seed, simulations, start, timeout):
+    """Runs `simulations` in a worker process, with a solver built from the parent solver `settings`
+
+    Returns a tuple as MonteCarloSavingsSolver.simulate, with solutions as lists of node ids,
+    and the worker statistics
+    """
+    data = shared.worker_data()
+
+    lambda_p, reference, neighbours, savings_threshold, pruning, improvement_threshold, min_simulations = settings
+
+    solver = MonteCarloSavingsSolver(lambda_p, reference, neighbours, savings_threshold, pruning=pruning,
+                                     improvement_threshold=improvement_threshold, min_simulations=min_simulations)
+    solver.share_bound(_worker['bound'])
+
+    improvements = _worker['improvements']
+
+    def on_improvement(best, time_found):
+        improvements.put((_route_ids(best), time_found))
+
+    savings_lists = solver.perturbed_savings_lists(data, numpy.random.default_rng(seed), simulations)
+    best, best_feasible, time_found, processed_count, solution_lengths = solver.simulate(
+        data, vehicles, savings_lists, start, timeout, simulations, on_improvement)
+
+    return (_route_ids(best), _route_ids(best_feasible), time_found, processed_count, solution_lengths,
+            solver._statistics)
@@ -0,0 +1,65 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+
+class RunningStatistics(object):
+    """Running count, sum, mean and variance of a sample (Welford's algorithm)
+
+    The sum is kept exactly, so samples of integer lengths can still be compared
+    without rounding errors
+    """
+
+    def __init__(self):
+        self._count = 0
+        self._total = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        """Adds `value` to the sample"""
+        self._count = self._count + 1
+        self._total = self._total + value
+
+        delta = value - self._mean
+        self._mean = self._mean + delta / self._count
+        self._m2 = self._m2 + delta * (value - self._mean)
+
+    def count(self):
+        return self._count
+
+    def total(self):
+        return self._total
+
+    def mean(self):
+        return self._mean
+
+    def variance(self):
+        """Returns the sample (unbiased) variance, 0 with less than two values"""
+        if self._count < 2:
+            return 0.0
+
+        return self._m2 / (self._count - 1)
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+def normal_cdf(x, mean, std):
+    """Returns P(X <= x) for X ~ N(mean, std^2)"""
+    if std == 0:
+        return 1.0 if x >= mean else 0.0
+
+    return 0.5 * (1.0 + math.erf((x - mean) / (std * math.sqrt(2.0))))
+
+def welch_t(first, second):
+    """Returns Welch's t statistic between two RunningStatistics samples
+
+    Infinite if both samples have no variance but different means
+    """
+    error = math.sqrt(first.variance() / first.count() + second.variance() / second.count())
+    difference = first.mean() - second.mean()
+
+    if error == 0:
+        return 0.0 if difference == 0 else math.copysign(math.inf, difference)
+
+    return difference / error
@@ -0,0 +1,341 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import functools
+import itertools
+
+import numpy
+
+# Pairs sorted by the first step of a LazySavingsList iteration (doubled on every step)
+LAZY_SORT_BLOCK = 1024
+
+# Customer rows processed together by granular_savings_order
+GRANULAR_BLOCK_ROWS = 256
+
+# Nearest neighbours of the first fallback level of a threshold only granular list
+GRANULAR_FALLBACK_NEIGHBOURS = 8
+
+def granular_savings(data, neighbours=None, threshold=None):
+    """Returns granular Clarke and Wright savings as arrays (i, j, saving)
+
+    Only pairs where j is one of the `neighbours` nearest customers of i (or i
+    of j), or whose saving is at least `threshold`, are kept. Distances are read
+    in blocks of customer rows, so memory is O(n * neighbours) plus one block,
+    also for lazy distance matrices.
+
+    Pairs are sorted like CVRPData.savings: by saving, in descending order, ties
+    keeping ids order. Computed once per instance and parameters (see
+    CVRPData.precomputed)
+    """
+    if neighbours is None and threshold is None:
+        raise Exception('Granular savings need neighbours or threshold')
+
+    return data.precomputed(('granular_savings', neighbours, threshold),
+                            lambda data: _compute_granular_savings(data, neighbours, threshold))
+
+def granular_savings_order(data, neighbours=None, threshold=None):
+    """Returns granular Clarke and Wright savings order as two arrays of node ids (i, j)
+
+    See `granular_savings`
+    """
+    savings_i, savings_j, values = granular_savings(data, neighbours, threshold)
+
+    return savings_i, savings_j
+
+def best_savings(data):
+    """Returns the largest saving of each customer with any other one, as arrays (best, prefix)
+
+    best[i] is the value of customer (node id) i, 0 for other ids. prefix[k] is the
+    sum of the k smallest values (prefix[0] is 0). Distances are read in blocks of
+    customer rows, so memory is O(n) plus one block, also for lazy distance
+    matrices. Computed once per instance (see CVRPData.precomputed)
+    """
+    return data.precomputed('best_savings', _compute_best_savings)
+
+def _compute_best_savings(data):
+    """Computes `best_savings`"""
+    matrix = data.matrix()
+    ids = data.customers()
+    depot_distances = data.depot_distances()
+    n = len(ids)
+
+    values = numpy.zeros(n, dtype=numpy.int64)
+
+    for start in range(0, n if n > 1 else 0, GRANULAR_BLOCK_ROWS):
+        rows = numpy.arange(start, min(start + GRANULAR_BLOCK_ROWS, n))
+        distances = numpy.asarray(matrix[ids[rows][:, numpy.newaxis], ids[numpy.newaxis, :]], dtype=numpy.int64)
+
+        savings = depot_distances[rows][:, numpy.newaxis] + depot_distances[numpy.newaxis, :] - distances
+        savings[numpy.arange(len(rows)), rows] = numpy.iinfo(numpy.int64).min # never with itself
+
+        values[rows] = savings.max(axis=1)
+
+    best = numpy.zeros(int(ids.max()) + 1 if n else 1, dtype=numpy.int64)
+    best[ids] = values
+
+    return best, numpy.concatenate(([0], numpy.cumsum(numpy.sort(values))))
+
+def granular_fallback(data, neighbours=None, threshold=None, level=1):
+    """Returns the fallback function of a granular savings list, None if it already has every pair
+
+    Fallback `level` lists the pairs of the granular list with twice the previous
+    level neighbours (threshold no longer used) which no previous level lists,
+    sorted by saving, and falls back to the next level, until every pair is
+    listed. So a construction reaching the fallback only computes the savings of
+    a few more neighbours, never the complete list (CVRPData.savings)
+    """
+    if _level_neighbours(neighbours, level - 1) >= len(data.customers()) - 1:
+        return None
+
+    return functools.partial(_fallback_savings_list, data, neighbours, threshold, level)
+
+def _level_neighbours(neighbours, level):
+    """Returns the neighbours of granular fallback `level` (level 0 is the granular list itself)"""
+    if neighbours is None:
+        return GRANULAR_FALLBACK_NEIGHBOURS * 2 ** (level - 1) if level else 0
+
+    return neighbours * 2 ** level
+
+def _fallback_savings_list(data, neighbours, threshold, level):
+    """Returns the SavingsList of granular fallback `level` (see `granular_fallback`)"""
+    savings_i, savings_j = _fallback_order(data, neighbours, threshold, level)
+
+    return SavingsList(data, savings_i, savings_j, granular_fallback(data, neighbours, threshold, level + 1))
+
+def _fallback_order(data, neighbours, threshold, level):
+    """Returns granular fallback `level` pairs as two arrays of node ids (i, j), computed once"""
+    return data.precomputed(('granular_fallback', neighbours, threshold, level),
+                            lambda data: _compute_fallback_order(data, neighbours, threshold, level))
+
+def _compute_fallback_order(data, neighbours, threshold, level):
+    """Computes `_fallback_order`"""
+    ids = data.customers()
+    n = len(ids)
+
+    index = numpy.zeros(int(ids.max()) + 1, dtype=numpy.int64)
+    index[ids] = numpy.arange(n)
+
+    previous = [granular_savings_order(data, neighbours, threshold)]
+    previous.extend(_fallback_order(data, neighbours, threshold, k) for k in range(1, level))
+
+    seen = []
+    for savings_i, savings_j in previous:
+        a, b = index[savings_i], index[savings_j]
+        seen.append(numpy.minimum(a, b) * n + numpy.maximum(a, b))
+
+    keys = numpy.setdiff1d(_granular_keys(data, _level_neighbours(neighbours, level), None),
+                           numpy.concatenate(seen))
+    savings_i, savings_j, values = _granular_pairs(data, keys)
+
+    return savings_i, savings_j
+
+def _compute_granular_savings(data, neighbours, threshold):
+    """Computes `granular_savings`"""
+    return _granular_pairs(data, _granular_keys(data, neighbours, threshold))
+
+def _granular_keys(data, neighbours, threshold):
+    """Returns the sorted keys of granular pairs of customer indices a < b, as a * n + b"""
+    matrix = data.matrix()
+    ids = data.customers()
+    depot_distances = data.depot_distances()
+    n = len(ids)
+
+    keys = []
+
+    for start in range(0, n, GRANULAR_BLOCK_ROWS):
+        rows = numpy.arange(start, min(start + GRANULAR_BLOCK_ROWS, n))
+        distances = numpy.asarray(matrix[ids[rows][:, numpy.newaxis], ids[numpy.newaxis, :]], dtype=numpy.int64)
+
+        if neighbours is not None and n > 1:
+            k = min(neighbours, n - 1)
+            masked = distances.astype(numpy.float64)
+            masked[numpy.arange(len(rows)), rows] = numpy.inf # never its own neighbour
+
+            columns = numpy.argpartition(masked, k - 1, axis=1)[:, :k]
+            a = numpy.repeat(rows, k)
+            b = columns.ravel()
+            keys.append(numpy.minimum(a, b) * n + numpy.maximum(a, b))
+
+        if threshold is not None:
+            savings = depot_distances[rows][:, numpy.newaxis] + depot_distances[numpy.newaxis, :] - distances
+            a, b = numpy.nonzero((savings >= threshold) & (numpy.arange(n)[numpy.newaxis, :] > rows[:, numpy.newaxis]))
+            keys.append(rows[a] * n + b)
+
+    return numpy.unique(numpy.concatenate(keys)) if keys else numpy.empty(0, dtype=numpy.int64)
+
+def _granular_pairs(data, keys):
+    """Returns the pairs of `keys` (see `_granular_keys`) as arrays (i, j, saving), sorted by saving"""
+    matrix = data.matrix()
+    ids = data.customers()
+    depot_distances = data.depot_distances()
+    n = len(ids)
+
+    rows, columns = keys // n, keys % n
+
+    distances = numpy.asarray(matrix[ids[rows], ids[columns]], dtype=numpy.int64)
+    savings = depot_distances[rows] + depot_distances[columns] - distances
+
+    order = numpy.argsort(-savings, kind='stable')
+
+    return ids[rows[order]], ids[columns[order]], savings[order]
+
+class SavingsList(object):
+    """Savings list stored as two int32 arrays of node ids (i, j), in processing order
+
+    Iterates as (Node, Node) pairs, like the list of tuples it replaces; `pairs`
+    iterates node ids instead, for in-place constructions (SavingsConstruction)
+
+    A reduced (granular) list may have a fallback, a function returning another
+    SavingsList (usually a larger granular one, see granular_fallback): its pairs
+    are iterated after this list ones, and it is only computed if iteration gets
+    that far
+    """
+
+    def __init__(self, cvrp_problem, i, j, fallback=None):
+        """Class constructor
+
+        Parameters:
+            cvrp_problem: CVRPData instance
+            i, j: node ids arrays, pair k is (i[k], j[k])
+            fallback: function returning the SavingsList iterated after this one
+        """
+        self._problem = cvrp_problem
+        self._i = numpy.asarray(i, dtype=numpy.int32)
+        self._j = numpy.asarray(j, dtype=numpy.int32)
+        self._lists = None
+        self._fallback = fallback
+
+    def ids(self):
+        """Returns the node ids arrays (i, j)"""
+        return self._i, self._j
+
+    def pairs(self):
+        """Returns an iterator over pairs of node ids, fallback pairs included"""
+        if self._lists is None:
+            self._lists = (self._i.tolist(), self._j.tolist())
+
+        if self._fallback is None:
+            return zip(*self._lists)
+
+        return itertools.chain(zip(*self._lists), self._fallback_pairs())
+
+    def _fallback_pairs(self):
+        """Generates fallback pairs, computing the fallback list on first use"""
+        if callable(self._fallback):
+            self._fallback = self._fallback()
+
+        for pair in self._fallback.pairs():
+            yield pair
+
+    def __iter__(self):
+        node = self._problem.node
+
+        for i, j in self.pairs():
+            yield (node(i), node(j))
+
+    def __len__(self):
+        """Returns this list size, fallback not included"""
+        return len(self._i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SavingsList(self._problem, self._i[index], self._j[index], self._fallback)
+
+        return (self._problem.node(int(self._i[index])), self._problem.node(int(self._j[index])))
+
+class LazySavingsList(SavingsList):
+    """Savings list of pairs (i, j) in descending order of `values`, sorted as it is iterated
+
+    `pairs` selects the next largest values block (numpy.partition) and sorts only
+    that block, doubling the block size on every step. A construction stopping
+    early pays for the pairs it actually used, not for sorting the whole list.
+    Any other access (ids, slices) sorts the whole list once
+
+    The order is the same as a stable descending sort: ties keep pairs order
+    """
+
+    def __init__(self, cvrp_problem, i, j, values, fallback=None, block=None):
+        """Class constructor
+
+        Parameters:
+            cvrp_problem: CVRPData instance
+            i, j: node ids arrays, pair k is (i[k], j[k]), not sorted
+            values: pair k sorting value (e.g. saving)
+            fallback: function returning the SavingsList iterated after this one
+            block: pairs sorted by the first step (default: LAZY_SORT_BLOCK)
+        """
+        super(LazySavingsList, self).__init__(cvrp_problem, i, j, fallback)
+
+        self._values = values
+        self._block = block or LAZY_SORT_BLOCK
+
+    def _sort(self):
+        """Sorts the whole list, if not sorted yet"""
+        if self._values is not None:
+            order = numpy.argsort(-self._values, kind='stable')
+
+            self._i = self._i[order]
+            self._j = self._j[order]
+            self._values = None
+
+    def _lazy_pairs(self):
+        """Generates pairs of node ids, sorting one block at a time"""
+        values = self._values
+        remaining = numpy.arange(len(values))
+        block = self._block
+
+        while remaining.size:
+            # Partitioning is not worth it once the block is a large part of the rest
+            if remaining.size > 2 * block:
+                remaining_values = values[remaining]
+
+                # Every pair with a value up to the block-th largest one, ties included
+                kth = numpy.partition(remaining_values, remaining.size - block)[remaining.size - block]
+                selected = remaining_values >= kth
+
+                chosen = remaining[selected]
+                remaining = remaining[~selected]
+            else:
+                chosen = remaining
+                remaining = remaining[:0]
+
+            # `chosen` keeps pairs order, so a stable sort breaks ties like _sort
+            chosen = chosen[numpy.argsort(-values[chosen], kind='stable')]
+
+            for pair in zip(self._i[chosen].tolist(), self._j[chosen].tolist()):
+                yield pair
+
+            block = block * 2
+
+    def ids(self):
+        self._sort()
+
+        return super(LazySavingsList, self).ids()
+
+    def pairs(self):
+        if self._values is None:
+            return super(LazySavingsList, self).pairs()
+
+        if self._fallback is None:
+            return self._lazy_pairs()
+
+        return itertools.chain(self._lazy_pairs(), self._fallback_pairs())
+
+    def __getitem__(self, index):
+        self._sort()
+
+        return super(LazySavingsList, self).__getitem__(index)
+
+def compute_savings_list(data, neighbours=None, threshold=None):
+    """Returns the Clarke and Wright SavingsList for `data`
+
+    If `neighbours` or `threshold` is given, the list is granular (see
+    granular_savings_order) and falls back to larger granular lists once
+    exhausted (see granular_fallback), so constructions can still reach a
+    complete solution
+    """
+    if neighbours is None and threshold is None:
+        return SavingsList(data, *data.savings_order())
+
+    return SavingsList(data, *granular_savings_order(data, neighbours, threshold),
+                       fallback=granular_fallback(data, neighbours, threshold))
@@ -4,30 +4,55 @@
 import sys
 import time
 
-from project import data_input, util
+from project import data_input, portfolio, util
 from project.solvers import clarke_wright, monte_carlo_savings, binary_mcscws
 
+TIMEOUT = 300
+
 def usage():
-    print("python {} <tspblib_file> <vehicles_number> [<lambda_p>]".format(sys.argv[0]))
+    print("python {} [--portfolio] <tspblib_file> <vehicles_number> [<lambda_p>]".format(sys.argv[0]))
+    print("  --portfolio: run all algorithms at the same time, for {} seconds in total".format(TIMEOUT))
+
+def run_portfolio(input_file, data, vehicles, algorithms):
+    """Runs all algorithms concurrently (see portfolio.run_portfolio) and prints the best solution"""
+    print("=== Starting portfolio ({}) ===\n".format(', '.join([algorithm for solver, algorithm in algorithms])))
+
+    result = portfolio.run_portfolio(data, vehicles, algorithms, TIMEOUT)
+
+    if result is None:
+        print('No solution found for \"{}\" problem'.format(input_file))
+        return
+
+    if not result.solution.is_complete():
+        print('Solution from algorithm {} not a complete solution'.format(result.algorithm))
+
+    print('{} solution:'.format(result.algorithm))
+    util.print_solution(result.solution)
+
+    print('Found after (seconds): {}'.format(result.elapsed))
+    print("")
+    print('Best solution for \"{}\" problem was from algorithm {}'.format(input_file, result.algorithm))
 
 def main():
-    if len(sys.argv) < 3: # python main.py <file> <vehicles_number> [<p>]
+    argv = [arg for arg in sys.argv if arg != '--portfolio']
+
+    if len(argv) < 3: # python main.py [--portfolio] <file> <vehicles_number> [<p>]
         return usage()
 
-    input_file = sys.argv[1]
-    data = data_input.read_file(input_file)
-    vehicles = int(sys.argv[2])
+    input_file = argv[1]
+    data = data_input.read_file(input_file, cache_dir=data_input.DEFAULT_CACHE_DIR)
+    vehicles = int(argv[2])
 
     lambda_p = None
 
-    if sys.argv == 4:
-        lambda_p = float(sys.argv[3])
+    if len(argv) == 4:
+        lambda_p = float(argv[3])
 
     clarke_wright_solver = clarke_wright.ClarkeWrightSolver()
     monte_carlo_savings_solver = monte_carlo_savings.MonteCarloSavingsSolver(lambda_p)
     binary_mcscws_solver = binary_mcscws.BinaryMCSCWSSolver()
 
-    timeout = 300
+    timeout = TIMEOUT
 
     algorithms = [
         (clarke_wright_solver, 'ClarkeWrightSolver'),
@@ -35,6 +60,9 @@ def main():
         (binary_mcscws_solver, 'BinaryMCSCWSSolver')
     ]
 
+    if len(argv) != len(sys.argv):
+        return run_portfolio(input_file, data, vehicles, algorithms)
+
     best_algorithm = None
     best_solution = None
 
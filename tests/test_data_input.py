@@ -1,10 +1,197 @@
 #!/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import random
+import shutil
+import tempfile
 import unittest
 
+from io import StringIO
+from os import path
+
+import numpy
+
+from project import data_input
+
+INPUT_DIR = path.join(path.dirname(path.abspath(__file__)), '..', 'input')
+
 class DataInputTest(unittest.TestCase):
     """Test data_input module"""
 
     def test_sanitize_filename(self):
         pass
+
+    def test_euc_distance_matrix_matches_scalar_rounding(self):
+        rng = random.Random(0)
+        points = [(rng.randint(-500, 500), rng.randint(-500, 500)) for _ in range(60)]
+        points.extend([(0, 0), (3, 4), (1, 1), (2.5, 0), (0.5, 0), (1.5, 0)])
+
+        matrix = data_input.calculate_euc_distance_matrix(points)
+
+        for i, a in enumerate(points):
+            for j, b in enumerate(points):
+                self.assertEqual(matrix[i, j], data_input.calculate_euc_distance(a, b))
+
+    def test_read_euc_2d_file(self):
+        data = data_input.read_file(path.join(INPUT_DIR, 'Augerat', 'A-n32-k5.vrp'))
+
+        self.assertEqual(len(list(data.nodes())), 32)
+        self.assertEqual(data.depot().name(), 1)
+        self.assertEqual(data.capacity(), 100)
+        # nodes 1 (82, 76) and 2 (96, 44)
+        self.assertEqual(data.distance_by_id(1, 2), 35)
+        self.assertEqual(data.distance_by_id(2, 1), 35)
+
+    def test_read_full_matrix_file(self):
+        data = data_input.read_file(path.join(INPUT_DIR, 'Example-n5-k2.vrp'))
+
+        self.assertEqual(data.distance_by_id(1, 6), 34)
+        self.assertEqual(data.distance_by_id(6, 1), 34)
+
+    def test_read_lazy_file(self):
+        filename = path.join(INPUT_DIR, 'Augerat', 'A-n32-k5.vrp')
+        data = data_input.read_file(filename)
+        lazy = data_input.read_file(filename, lazy=True)
+
+        self.assertTrue(lazy.is_lazy())
+        self.assertFalse(data.is_lazy())
+
+        for i, j in data.edges():
+            self.assertEqual(lazy.distance(i, j), data.distance(i, j))
+
+        for a, b in zip(lazy.savings_order(), data.savings_order()):
+            self.assertEqual(list(a), list(b))
+
+    def test_lazy_requires_coordinates(self):
+        with self.assertRaises(data_input.ParseException):
+            data_input.read_file(path.join(INPUT_DIR, 'Example-n5-k2.vrp'), lazy=True)
+
+class EdgeWeightSectionTest(unittest.TestCase):
+    """Test data_input EDGE_WEIGHT_SECTION formats"""
+
+    MATRIX = [
+        [0, 28, 31, 20],
+        [28, 0, 21, 29],
+        [31, 21, 0, 38],
+        [20, 29, 38, 0],
+    ]
+
+    def parse(self, edge_weight_format, weights):
+        text = '\n'.join([
+            'NAME : test',
+            'COMMENT : test',
+            'TYPE : CVRP',
+            'DIMENSION : 4',
+            'EDGE_WEIGHT_TYPE : EXPLICIT',
+            'EDGE_WEIGHT_FORMAT : {}'.format(edge_weight_format),
+            'CAPACITY : 100',
+            'EDGE_WEIGHT_SECTION',
+            weights,
+            'DEMAND_SECTION',
+            '1 0',
+            '2 10',
+            '3 20',
+            '4 30',
+            'DEPOT_SECTION',
+            '1',
+            '-1',
+            'EOF',
+        ])
+
+        return data_input._parse_tsplib(StringIO(text))
+
+    def assert_matrix(self, specs):
+        self.assertTrue((specs['MATRIX'][1:, 1:] == numpy.array(self.MATRIX)).all())
+
+    def test_full_matrix(self):
+        self.assert_matrix(self.parse('FULL_MATRIX', '0 28 31 20\n28 0 21 29\n31 21 0 38\n20 29 38 0'))
+
+    def test_upper_row(self):
+        self.assert_matrix(self.parse('UPPER_ROW', '28 31 20\n21 29\n38'))
+
+    def test_lower_row(self):
+        self.assert_matrix(self.parse('LOWER_ROW', '28\n31 21\n20 29 38'))
+
+    def test_upper_diag_row(self):
+        self.assert_matrix(self.parse('UPPER_DIAG_ROW', '0 28 31 20\n0 21 29\n0 38\n0'))
+
+    def test_lower_diag_row(self):
+        self.assert_matrix(self.parse('LOWER_DIAG_ROW', '0\n28 0\n31 21 0\n20 29 38 0'))
+
+    def test_values_wrapping_across_lines(self):
+        self.assert_matrix(self.parse('UPPER_ROW', '28 31\n20 21\n  29 38'))
+
+    def test_missing_values(self):
+        with self.assertRaises(data_input.ParseException):
+            self.parse('UPPER_ROW', '28 31 20\n21 29')
+
+class CompiledInstanceCacheTest(unittest.TestCase):
+    """Test data_input compiled instances cache"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.filename = path.join(INPUT_DIR, 'Augerat', 'P-n16-k8.vrp')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_cached_instance_matches_parsed_instance(self):
+        parsed = data_input.read_file(self.filename)
+        first = data_input.read_file(self.filename, cache_dir=self.cache_dir)
+        cached = data_input.read_file(self.filename, cache_dir=self.cache_dir)
+
+        for data in [first, cached]:
+            self.assertTrue((data.matrix() == parsed.matrix()).all())
+            self.assertEqual(data.capacity(), parsed.capacity())
+            self.assertEqual(data.depot().name(), parsed.depot().name())
+            self.assertEqual([(n.name(), n.demand()) for n in data.nodes()],
+                             [(n.name(), n.demand()) for n in parsed.nodes()])
+
+            for a, b in zip(data.savings_order(), parsed.savings_order()):
+                self.assertEqual(list(a), list(b))
+
+    def test_cache_is_keyed_by_content(self):
+        data_input.read_file(self.filename, cache_dir=self.cache_dir)
+        data_input.read_file(self.filename, cache_dir=self.cache_dir)
+        data_input.read_file(path.join(INPUT_DIR, 'Example-n5-k2.vrp'), cache_dir=self.cache_dir)
+
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_cache_not_writable(self):
+        # A regular file, so the cache directory can not be created
+        cache_dir = path.join(self.filename, 'cache')
+
+        data = data_input.read_file(self.filename, cache_dir=cache_dir)
+
+        self.assertEqual(len(list(data.nodes())), 16)
+
+class CatalogTest(unittest.TestCase):
+    """Test data_input catalog"""
+
+    def test_vehicles_from_filename(self):
+        self.assertEqual(data_input.vehicles_from_filename('input/Augerat/A-n32-k5.vrp'), 5)
+        self.assertEqual(data_input.vehicles_from_filename('input/Augerat/P-n101-k4.vrp'), 4)
+        self.assertEqual(data_input.vehicles_from_filename('input/Vigo/E076-14u.vrp'), 14)
+        self.assertEqual(data_input.vehicles_from_filename('input/Vigo/E076A10r.vrp'), None)
+
+    def test_read_catalog(self):
+        for processes in [1, 2]:
+            catalog = data_input.read_catalog(path.join(INPUT_DIR, 'Augerat', 'P-n1*.vrp'), processes=processes)
+
+            self.assertEqual(list(catalog), ['P-n101-k4', 'P-n16-k8', 'P-n19-k2'])
+            self.assertEqual(catalog.vehicles('P-n16-k8'), 8)
+            self.assertEqual(len(list(catalog['P-n16-k8'].nodes())), 16)
+            self.assertEqual(catalog['P-n19-k2'].capacity(), 160)
+
+    def test_catalog_workers_compile(self):
+        catalog = data_input.read_catalog(path.join(INPUT_DIR, 'Augerat', 'P-n1*.vrp'), processes=2)
+
+        # Workers only return compiled instance directories, loaded on access
+        for future in list(catalog._futures.values()):
+            self.assertTrue(path.isdir(future.result()))
+
+        self.assertEqual(catalog._instances, {})
+        self.assertIsInstance(catalog['P-n16-k8'].savings()[2], numpy.memmap)
+        self.assertEqual(list(catalog['P-n16-k8'].savings_order()[0]),
+                         list(data_input.read_file(catalog.filename('P-n16-k8')).savings_order()[0]))
@@ -0,0 +1,39 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+import numpy
+
+from project.distances import euclidean, LazyEuclideanMatrix
+
+class LazyEuclideanMatrixTest(unittest.TestCase):
+    """Test distances.LazyEuclideanMatrix"""
+
+    def setUp(self):
+        rng = random.Random(1)
+        self.points = numpy.array([(rng.randint(0, 1000), rng.randint(0, 1000)) for _ in range(50)])
+        self.dense = euclidean(self.points[:, numpy.newaxis], self.points[numpy.newaxis, :])
+        self.matrix = LazyEuclideanMatrix(self.points, block_rows=8, max_cache_bytes=2 * 8 * 50 * 8)
+
+    def test_item_matches_dense(self):
+        for i in range(50):
+            for j in range(50):
+                self.assertEqual(self.matrix.item(i, j), self.dense[i, j])
+
+    def test_indexing_matches_dense(self):
+        origins = numpy.array([0, 5, 49, 17])
+        destinations = numpy.array([3, 5, 0, 48])
+
+        self.assertEqual(list(self.matrix[origins, destinations]), list(self.dense[origins, destinations]))
+        self.assertEqual(list(self.matrix[7, destinations]), list(self.dense[7, destinations]))
+
+    def test_cache_is_bounded(self):
+        for i in range(50):
+            self.assertEqual(list(self.matrix.row(i)), list(self.dense[i]))
+
+        self.assertEqual(self.matrix.cached_blocks(), 2)
+
+if __name__ == '__main__':
+    unittest.main()
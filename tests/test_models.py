@@ -0,0 +1,173 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from project.models import CVRPData, Route, VersionedArray
+
+def example_data():
+    """Returns a small CVRPData instance (depot 1 and three customers)"""
+    return CVRPData({
+        'MATRIX': {
+            1: {1: 0, 2: 10, 3: 12, 4: 20},
+            2: {2: 0, 3: 5, 4: 15},
+            3: {3: 0, 4: 9},
+            4: {4: 0},
+        },
+        'DEMAND': {1: 0, 2: 3, 3: 4, 4: 5},
+        'DEPOT': 1,
+        'CAPACITY': 15,
+    })
+
+class CVRPDataTest(unittest.TestCase):
+    """Test CVRPData model"""
+
+    def setUp(self):
+        self.data = example_data()
+
+    def test_distance_is_symmetric(self):
+        a, b = self.data.node(2), self.data.node(4)
+
+        self.assertEqual(self.data.distance(a, b), 15)
+        self.assertEqual(self.data.distance(b, a), 15)
+        self.assertEqual(self.data.distance_by_id(4, 2), 15)
+
+    def test_bulk_distances(self):
+        self.assertEqual(list(self.data.distances([1, 2, 3], [2, 3, 4])), [10, 5, 9])
+        self.assertEqual(self.data.path_length([1, 2, 3, 4, 1]), 10 + 5 + 9 + 20)
+        self.assertEqual(self.data.path_length([1]), 0)
+
+    def test_edges(self):
+        edges = [(i.name(), j.name()) for i, j in self.data.edges()]
+
+        self.assertEqual(edges, [(1, 2), (1, 3), (1, 4), (2, 3), (2, 4), (3, 4)])
+
+    def test_depot(self):
+        self.assertEqual(self.data.depot().name(), 1)
+
+    def test_savings(self):
+        savings_i, savings_j, values = self.data.savings()
+
+        # S(2,3) = 10 + 12 - 5, S(2,4) = 10 + 20 - 15, S(3,4) = 12 + 20 - 9
+        self.assertEqual(list(zip(savings_i, savings_j, values)), [(3, 4, 23), (2, 3, 17), (2, 4, 15)])
+        self.assertEqual(list(self.data.depot_distances()), [10, 12, 20])
+
+    def test_precomputed_values_are_shared_and_read_only(self):
+        savings = self.data.savings()
+
+        self.assertIs(self.data.savings(), savings)
+        self.assertFalse(savings[2].flags.writeable)
+
+        with self.assertRaises(ValueError):
+            savings[2][0] = 0
+
+        self.data.invalidate()
+
+        self.assertIsNot(self.data.savings(), savings)
+        self.assertEqual(list(self.data.savings()[2]), list(savings[2]))
+
+class RouteTest(unittest.TestCase):
+    """Test Route model"""
+
+    def setUp(self):
+        self.data = example_data()
+        self.nodes = [self.data.node(i) for i in [2, 3, 4]]
+        self.route = Route(self.data, self.data.capacity())
+
+    def test_allocate_keeps_positions(self):
+        a, b, c = self.nodes
+
+        self.route.allocate([b])
+        self.route.allocate([c])
+        self.route.allocate([a], append=False)
+
+        self.assertEqual([n.name() for n in self.route.nodes()], [2, 3, 4])
+        self.assertEqual([self.route.position(n) for n in self.nodes], [0, 1, 2])
+        self.assertTrue(self.route.first(a))
+        self.assertTrue(self.route.last(c))
+        self.assertTrue(self.route.is_interior(b))
+        self.assertFalse(self.route.is_interior(a))
+        self.assertEqual(self.route.demand(), 12)
+        self.assertEqual(self.route.length(), 10 + 5 + 9 + 20)
+
+    def test_deallocate(self):
+        a, b, c = self.nodes
+        self.route.allocate(self.nodes)
+
+        self.route.deallocate([b])
+        self.assertEqual([n.name() for n in self.route.nodes()], [2, 4])
+        self.assertTrue(self.route.last(c))
+
+        self.route.deallocate([a])
+        self.assertTrue(self.route.first(c))
+        self.assertEqual(self.route.demand(), 5)
+        self.assertIsNone(a.route_allocation())
+
+    def test_allocate_moves_nodes_between_routes(self):
+        other = Route(self.data, self.data.capacity())
+        other.allocate(self.nodes[:2])
+        self.route.allocate(self.nodes[2:])
+
+        self.route.allocate(list(other.nodes()))
+
+        self.assertEqual(len(other), 0)
+        self.assertEqual([n.name() for n in self.route.nodes()], [4, 2, 3])
+        self.assertIs(self.nodes[0].route_allocation(), self.route)
+
+    def test_length_is_maintained(self):
+        a, b, c = self.nodes
+
+        self.route.allocate([b])
+        self.route.allocate([a], append=False)
+        self.route.allocate([c])
+        self.assertEqual(self.route.length(), self.route.compute_length())
+
+        self.route.deallocate([b])
+        self.assertEqual(self.route.length(), 10 + 15 + 20)
+
+        self.route.deallocate([a, c])
+        self.assertEqual(self.route.length(), 0)
+
+    def test_joined(self):
+        a, b, c = self.nodes
+        other = Route(self.data, self.data.capacity())
+        self.route.allocate([a])
+        other.allocate([b, c])
+
+        joined = self.route.joined(other)
+
+        self.assertEqual(joined.length(), self.route.length() + other.length() - (10 + 12 - 5))
+        self.assertEqual([n.name() for n in joined.nodes()], [2, 3, 4])
+        self.assertEqual(joined.length(), joined.compute_length())
+        self.assertEqual(joined.demand(), 12)
+        self.assertIs(c.route_allocation(), other) # allocation is not changed
+        self.assertEqual(len(other), 2)
+
+    def test_capacity(self):
+        self.route = Route(self.data, 8)
+        self.route.allocate(self.nodes[:2])
+
+        with self.assertRaises(Exception):
+            self.route.allocate(self.nodes[2:])
+
+class VersionedArrayTest(unittest.TestCase):
+    """Test models.VersionedArray"""
+
+    def test_versions(self):
+        first = VersionedArray([0, 1, 2, 3])
+        second = first.update([(1, 10), (2, 20)])
+        third = second.update([(1, 100)])
+        branch = first.update([(3, 30), (3, 31)])
+
+        for _ in range(2): # any access order
+            self.assertEqual(list(third), [0, 100, 20, 3])
+            self.assertEqual(list(first), [0, 1, 2, 3])
+            self.assertEqual(branch.get(3), 31)
+            self.assertEqual(list(second), [0, 10, 20, 3])
+            self.assertEqual(list(branch), [0, 1, 2, 31])
+            self.assertEqual(third.get(2), 20)
+
+        self.assertEqual(len(branch), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import time
+import unittest
+
+from os import path
+
+from project import data_input, portfolio
+from project.solvers import binary_mcscws, clarke_wright, monte_carlo_savings
+
+INPUT_DIR = path.join(path.dirname(path.abspath(__file__)), '..', 'input')
+
+class PortfolioTest(unittest.TestCase):
+    """Test portfolio.run_portfolio"""
+
+    def setUp(self):
+        self.data = data_input.read_file(path.join(INPUT_DIR, 'Augerat', 'P-n16-k8.vrp'))
+
+    def algorithms(self):
+        return [
+            (clarke_wright.ClarkeWrightSolver(), 'ClarkeWrightSolver'),
+            (monte_carlo_savings.MonteCarloSavingsSolver(seed=1), 'MonteCarloSavingsSolver'),
+        ]
+
+    def test_best_solution(self):
+        clarke_wright_length = clarke_wright.ClarkeWrightSolver().solve(self.data, 8, 60).length()
+
+        result = portfolio.run_portfolio(self.data, 8, self.algorithms(), 60)
+
+        self.assertTrue(result.solution.is_complete())
+        self.assertEqual(result.cost, result.solution.compute_length())
+        self.assertLessEqual(result.cost, clarke_wright_length)
+        self.assertIn(result.algorithm, ['ClarkeWrightSolver', 'MonteCarloSavingsSolver'])
+
+    def test_target(self):
+        start = time.time()
+
+        result = portfolio.run_portfolio(self.data, 8, self.algorithms(), 60, target=10 ** 6)
+
+        self.assertTrue(result.solution.is_complete())
+        self.assertLess(time.time() - start, 30)
+
+    def test_worker_processes(self):
+        algorithms = [
+            (monte_carlo_savings.MonteCarloSavingsSolver(seed=1, processes=2), 'MonteCarloSavingsSolver'),
+            (binary_mcscws.BinaryMCSCWSSolver(seed=3, processes=2), 'BinaryMCSCWSSolver'),
+        ]
+
+        result = portfolio.run_portfolio(self.data, 8, algorithms, 60)
+
+        self.assertTrue(result.solution.is_complete())
+        self.assertEqual(result.cost, result.solution.compute_length())
+
+    def test_timeout(self):
+        data = data_input.read_file(path.join(INPUT_DIR, 'Vigo', 'E200-17b.vrp'))
+        algorithms = [(binary_mcscws.BinaryMCSCWSSolver(), 'BinaryMCSCWSSolver')]
+
+        start = time.time()
+
+        # Much shorter than a BinaryMCS-CWS solve: its solutions are received before the deadline
+        result = portfolio.run_portfolio(data, 17, algorithms, 2)
+
+        self.assertIsNotNone(result)
+        self.assertEqual(result.algorithm, 'BinaryMCSCWSSolver')
+        self.assertLess(time.time() - start, 2 + portfolio.STOP_GRACE)
+
+    def test_shared_bound_prunes(self):
+        solver = monte_carlo_savings.MonteCarloSavingsSolver(seed=1)
+        solver.share_bound(multiprocessing.Value('q', 0)) # Nothing can beat it
+
+        self.assertEqual(list(solver.incumbents(self.data, 8, 60)), [])
+        self.assertEqual(solver.statistics()['pruned'],
+                         monte_carlo_savings.MonteCarloSavingsSolver.DEFAULT_SIMULATIONS_PER_EXECUTION)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import random
+import unittest
+
+import numpy
+
+from project.solvers import sampling
+
+def running_statistics(values):
+    running = sampling.RunningStatistics()
+
+    for value in values:
+        running.add(value)
+
+    return running
+
+class RunningStatisticsTest(unittest.TestCase):
+    """Test sampling.RunningStatistics"""
+
+    def test_matches_numpy(self):
+        rng = random.Random(1)
+        values = [rng.randint(700, 900) for _ in range(40)]
+
+        running = running_statistics(values)
+
+        self.assertEqual(running.count(), 40)
+        self.assertEqual(running.total(), sum(values))
+        self.assertAlmostEqual(running.mean(), numpy.mean(values))
+        self.assertAlmostEqual(running.variance(), numpy.var(values, ddof=1))
+
+    def test_single_value(self):
+        running = running_statistics([5])
+
+        self.assertEqual(running.variance(), 0.0)
+
+class SamplingTest(unittest.TestCase):
+    """Test sampling functions"""
+
+    def test_normal_cdf(self):
+        self.assertAlmostEqual(sampling.normal_cdf(10, 10, 3), 0.5)
+        self.assertAlmostEqual(sampling.normal_cdf(10 + 1.96 * 3, 10, 3), 0.975, places=3)
+        self.assertEqual(sampling.normal_cdf(9, 10, 0), 0.0)
+        self.assertEqual(sampling.normal_cdf(10, 10, 0), 1.0)
+
+    def test_welch_t(self):
+        first = running_statistics([10, 12, 11, 13])
+        second = running_statistics([20, 22, 21, 23, 19])
+
+        error = numpy.var([10, 12, 11, 13], ddof=1) / 4 + numpy.var([20, 22, 21, 23, 19], ddof=1) / 5
+        expected = (11.5 - 21) / math.sqrt(error)
+
+        self.assertAlmostEqual(sampling.welch_t(first, second), expected)
+        self.assertEqual(sampling.welch_t(running_statistics([1, 1]), running_statistics([1, 1])), 0.0)
+        self.assertEqual(sampling.welch_t(running_statistics([1, 1]), running_statistics([2, 2])), -math.inf)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from os import path
+
+from project import data_input, shared
+
+INPUT_DIR = path.join(path.dirname(path.abspath(__file__)), '..', 'input')
+
+class SharedInstanceTest(unittest.TestCase):
+    """Test shared.SharedInstance"""
+
+    def check_attached(self, data, savings=True):
+        with shared.SharedInstance(data, savings) as instance:
+            attached, blocks = shared.attach(instance.descriptor())
+
+            self.assertEqual(sorted([(n.name(), n.demand()) for n in attached.nodes()]),
+                             sorted([(n.name(), n.demand()) for n in data.nodes()]))
+            self.assertEqual(attached.depot(), data.depot())
+            self.assertEqual(attached.capacity(), data.capacity())
+
+            for computed, expected in zip(attached.savings(), data.savings()):
+                self.assertEqual(computed.tolist(), expected.tolist())
+
+            for i, j in data.edges():
+                self.assertEqual(attached.distance(i, j), data.distance(i, j))
+
+            for block in blocks:
+                block.close()
+
+    def test_attach(self):
+        self.check_attached(data_input.read_file(path.join(INPUT_DIR, 'Augerat', 'P-n16-k8.vrp')))
+
+    def test_attach_lazy(self):
+        data = data_input.read_file(path.join(INPUT_DIR, 'Augerat', 'P-n16-k8.vrp'), lazy=True)
+
+        self.check_attached(data)
+
+        with shared.SharedInstance(data) as instance:
+            self.assertIsNone(instance.descriptor()['LAZY_MATRIX'])
+            self.assertIn('points', instance.descriptor()['ARRAYS'])
+
+    def test_savings_not_computed(self):
+        data = data_input.read_file(path.join(INPUT_DIR, 'Augerat', 'P-n16-k8.vrp'), lazy=True)
+
+        with shared.SharedInstance(data) as instance:
+            attached, blocks = shared.attach(instance.descriptor())
+
+            self.assertFalse(data.is_precomputed('savings'))
+            self.assertFalse(attached.is_precomputed('savings'))
+
+            for block in blocks:
+                block.close()
+
+        self.check_attached(data, savings=False)
+
+if __name__ == '__main__':
+    unittest.main()
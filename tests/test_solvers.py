@@ -0,0 +1,673 @@
+#!/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import itertools
+import random
+import time
+import unittest
+
+from os import path
+
+from project import data_input
+from project.solvers import clarke_wright, monte_carlo_savings, binary_mcscws
+from project.solvers import sampling, savings
+from project.solvers.construction import SavingsConstruction
+
+INPUT_DIR = path.join(path.dirname(path.abspath(__file__)), '..', 'input')
+
+def read_instance(name, directory='Augerat'):
+    return data_input.read_file(path.join(INPUT_DIR, directory, '{}.vrp'.format(name)))
+
+def route_names(solution):
+    return sorted([[node.name() for node in route.nodes()] for route in solution.routes()])
+
+class ClarkeWrightSolverTest(unittest.TestCase):
+    """Test Clarke and Wright Savings solver"""
+
+    def test_solve(self):
+        data = read_instance('A-n32-k5')
+
+        solution = clarke_wright.ClarkeWrightSolver().solve(data, 5, 60)
+
+        self.assertTrue(solution.is_complete())
+        self.assertEqual(solution.length(), 842)
+        self.assertEqual(sorted(sum(route_names(solution), [])), list(range(2, 33)))
+
+    def test_incumbents(self):
+        data = read_instance('A-n32-k5')
+
+        incumbents = list(clarke_wright.ClarkeWrightSolver().incumbents(data, 5, 60))
+
+        self.assertEqual(len(incumbents), 1)
+        self.assertEqual(incumbents[0].cost, 842)
+        self.assertEqual(incumbents[0].iteration, 1)
+
+    def test_reference_mode_builds_same_solution(self):
+        data = read_instance('A-n32-k5')
+
+        solution = clarke_wright.ClarkeWrightSolver().solve(data, 5, 60)
+        reference = clarke_wright.ClarkeWrightSolver(reference=True).solve(data, 5, 60)
+
+        self.assertEqual(route_names(solution), route_names(reference))
+        self.assertEqual(solution.length(), reference.length())
+
+    def test_savings_list_matches_pairwise_computation(self):
+        data = read_instance('P-n19-k2')
+        depot = data.depot()
+
+        savings = {}
+        for i, j in data.edges():
+            if i != depot and j != depot:
+                savings[(i.name(), j.name())] = data.distance(depot, i) + data.distance(depot, j) - data.distance(i, j)
+
+        expected = sorted(savings, key=lambda pair: savings[pair], reverse=True)
+        savings_list = clarke_wright.ClarkeWrightSolver().compute_savings_list(data)
+
+        self.assertEqual(list(savings_list.pairs()), expected)
+        self.assertEqual([(i.name(), j.name()) for i, j in savings_list], expected)
+        self.assertEqual(len(savings_list), len(expected))
+        self.assertEqual(list(savings_list[3:5].pairs()), expected[3:5])
+        self.assertEqual(savings_list[0], (data.node(expected[0][0]), data.node(expected[0][1])))
+        self.assertEqual(savings_list.ids()[0].dtype.name, 'int32')
+
+class PerturbedSavingsTest(unittest.TestCase):
+    """Test Monte Carlo Savings perturbed savings lists"""
+
+    def setUp(self):
+        self.data = read_instance('P-n19-k2')
+
+    def savings_lists(self, **kwargs):
+        solver = monte_carlo_savings.MonteCarloSavingsSolver(**kwargs)
+
+        return [list(savings_list.pairs()) for savings_list in solver.compute_list_of_savings_list(self.data)]
+
+    def test_reproducible_for_seed(self):
+        first = self.savings_lists(seed=3)
+
+        self.assertEqual(len(first), monte_carlo_savings.MonteCarloSavingsSolver.DEFAULT_SIMULATIONS_PER_EXECUTION)
+        self.assertEqual(first, self.savings_lists(seed=3))
+        self.assertNotEqual(first, self.savings_lists(seed=4))
+
+    def test_blocks(self):
+        first = self.savings_lists(seed=3)
+
+        solver = monte_carlo_savings.MonteCarloSavingsSolver(seed=3)
+        solver.MAX_BLOCK_VALUES = 1000  # some blocks
+        blocks = [list(savings_list.pairs()) for savings_list in solver.compute_list_of_savings_list(self.data)]
+
+        self.assertEqual(len(blocks), len(first))
+        self.assertEqual(blocks, first)
+
+    def test_no_perturbation_is_savings_order(self):
+        complete = list(zip(*[ids.tolist() for ids in self.data.savings_order()]))
+
+        self.assertEqual(self.savings_lists(lambda_p=0.0, seed=1)[0], complete)
+
+class LazySavingsListTest(unittest.TestCase):
+    """Test savings.LazySavingsList"""
+
+    def setUp(self):
+        self.data = read_instance('P-n19-k2')
+        self.savings_i, self.savings_j, values = self.data.savings()
+
+        # Many ties, most of them across blocks
+        self.values = values // 10
+
+    def expected(self):
+        order = sorted(range(len(self.values)), key=lambda k: -self.values[k])
+
+        return [(int(self.savings_i[k]), int(self.savings_j[k])) for k in order]
+
+    def test_pairs(self):
+        for block in [1, 7, 50, 10000]:
+            savings_list = savings.LazySavingsList(self.data, self.savings_i, self.savings_j, self.values, block=block)
+
+            self.assertEqual(list(savings_list.pairs()), self.expected())
+
+    def test_sorted_access(self):
+        savings_list = savings.LazySavingsList(self.data, self.savings_i, self.savings_j, self.values, block=5)
+        savings_i, savings_j = savings_list.ids()
+
+        self.assertEqual(list(zip(savings_i.tolist(), savings_j.tolist())), self.expected())
+        self.assertEqual(list(savings_list[:3].pairs()), self.expected()[:3])
+        self.assertEqual(list(savings_list.pairs()), self.expected())
+
+class GranularSavingsTest(unittest.TestCase):
+    """Test granular savings lists"""
+
+    def setUp(self):
+        self.data = read_instance('A-n32-k5')
+        self.complete = list(zip(*[ids.tolist() for ids in self.data.savings_order()]))
+
+    def granular_pairs(self, **kwargs):
+        return list(zip(*[ids.tolist() for ids in savings.granular_savings_order(self.data, **kwargs)]))
+
+    def test_all_neighbours_is_complete_list(self):
+        self.assertEqual(self.granular_pairs(neighbours=30), self.complete)
+
+    def test_neighbours(self):
+        pairs = self.granular_pairs(neighbours=3)
+        customers = self.data.customers().tolist()
+
+        self.assertEqual(pairs, [pair for pair in self.complete if pair in set(pairs)])
+        self.assertLessEqual(len(pairs), 3 * len(customers))
+
+        for i in customers:
+            nearest = sorted([j for j in customers if j != i], key=lambda j: self.data.distance_by_id(i, j))[0]
+            self.assertIn((min(i, nearest), max(i, nearest)), pairs)
+
+    def test_threshold(self):
+        savings_i, savings_j = self.data.savings_order()
+        depot = self.data.depot().name()
+        distance = self.data.distance_by_id
+
+        expected = [(i, j) for i, j in self.complete
+                    if distance(depot, i) + distance(depot, j) - distance(i, j) >= 50]
+
+        self.assertEqual(self.granular_pairs(threshold=50), expected)
+
+    def test_fallback(self):
+        savings_list = savings.compute_savings_list(self.data, neighbours=3)
+        pairs = list(savings_list.pairs())
+
+        # Every pair once: the granular list, then pairs of 6, 12, 24 and 31 neighbours
+        self.assertEqual(sorted(pairs), sorted(self.complete))
+        self.assertEqual(pairs[:len(savings_list)], self.granular_pairs(neighbours=3))
+
+        levels = [self.granular_pairs(neighbours=k) for k in [3, 6, 12, 24, 31]]
+        for previous, level in zip(levels, levels[1:]):
+            added = [pair for pair in level if pair not in set(previous)]
+            self.assertEqual(pairs[len(previous):len(level)], added)
+
+    def test_threshold_fallback(self):
+        savings_list = savings.compute_savings_list(self.data, threshold=50)
+        pairs = list(savings_list.pairs())
+
+        self.assertEqual(sorted(pairs), sorted(self.complete))
+        self.assertEqual(pairs[:len(savings_list)], self.granular_pairs(threshold=50))
+
+    def test_fallback_stays_granular(self):
+        data = read_instance('A-n32-k5')
+
+        savings_list = savings.compute_savings_list(data, neighbours=3)
+        pairs = list(itertools.islice(savings_list.pairs(), len(savings_list) + 1))
+
+        self.assertEqual(len(pairs), len(savings_list) + 1)
+        self.assertNotIn('savings', data._precomputed)
+
+    def test_solvers(self):
+        lazy = data_input.read_file(path.join(INPUT_DIR, 'Augerat', 'A-n32-k5.vrp'), lazy=True)
+
+        for solver in [clarke_wright.ClarkeWrightSolver(neighbours=5),
+                       monte_carlo_savings.MonteCarloSavingsSolver(neighbours=5),
+                       binary_mcscws.BinaryMCSCWSSolver(rollout_mode='trail', savings_threshold=40)]:
+            solution = solver.solve(lazy, 5, 5)
+
+            self.assertTrue(solution.is_complete())
+
+class ClarkeWrightSolutionTest(unittest.TestCase):
+    """Test Clarke and Wright solution copy-on-write state"""
+
+    def setUp(self):
+        self.data = read_instance('P-n16-k8')
+        self.solution = clarke_wright.ClarkeWrightSolution(self.data, 8)
+
+    def test_process_does_not_change_original(self):
+        before = route_names(self.solution)
+        length = self.solution.length()
+
+        processed, inserted = self.solution.process((self.data.node(10), self.data.node(11)))
+
+        self.assertTrue(inserted)
+        self.assertEqual(route_names(self.solution), before)
+        self.assertEqual(self.solution.length(), length)
+        self.assertEqual(self.solution.compute_length(), length)
+        self.assertIn([11, 10], route_names(processed))
+        self.assertEqual(processed.length(), processed.compute_length())
+
+    def test_clones_are_independent(self):
+        clone = self.solution.clone()
+
+        processed, inserted = clone.process((self.data.node(10), self.data.node(11)))
+        clone._merge(clone.route_allocation(self.data.node(12)), clone.route_allocation(self.data.node(14)))
+
+        self.assertEqual(len(route_names(self.solution)), 15)
+        self.assertEqual(len(route_names(processed)), 14)
+        self.assertIn([12, 14], route_names(clone))
+        self.assertNotIn([12, 14], route_names(processed))
+        self.assertIs(self.solution.route_allocation(self.data.node(12)),
+                      processed.route_allocation(self.data.node(12)))
+
+class SavingsConstructionTest(unittest.TestCase):
+    """Test in-place savings construction"""
+
+    def setUp(self):
+        self.data = read_instance('P-n16-k8')
+
+    def test_merge_rules(self):
+        construction = SavingsConstruction(self.data, 8)
+
+        self.assertTrue(construction.merge(10, 11)) # [11, 10]
+        self.assertFalse(construction.merge(10, 11)) # same route
+        self.assertTrue(construction.can_merge(12, 11))
+        self.assertTrue(construction.merge(12, 11)) # [12, 11, 10]
+        self.assertFalse(construction.merge(11, 14)) # 11 is interior
+        self.assertFalse(construction.merge(10, 3)) # over capacity
+        self.assertTrue(construction.merge(12, 14)) # [14, 12, 11, 10]
+        self.assertEqual([route for route in construction.routes() if len(route) > 1], [[14, 12, 11, 10]])
+
+    def test_length_and_solution(self):
+        construction = SavingsConstruction(self.data, 8)
+
+        for i, j in [(10, 11), (12, 11), (6, 16)]:
+            construction.merge(i, j)
+
+        solution = construction.to_solution(clarke_wright.ClarkeWrightSolution)
+
+        self.assertEqual(solution.length(), construction.length())
+        self.assertEqual(solution.compute_length(), construction.length())
+        self.assertEqual(len(list(solution.routes())), 15 - 3)
+
+    def test_state_hash(self):
+        construction = SavingsConstruction(self.data, 8)
+        initial = construction.state_hash()
+
+        construction.merge(10, 11) # [11, 10]
+        construction.merge(12, 11) # [12, 11, 10]
+        merged = construction.state_hash()
+
+        other = SavingsConstruction(self.data, 8)
+        other.merge(11, 12) # [12, 11]
+        other.merge(10, 11) # [12, 11, 10]
+
+        self.assertNotEqual(merged, initial)
+        self.assertEqual(other.state_hash(), merged)
+        self.assertEqual(SavingsConstruction.from_solution(
+            construction.to_solution(clarke_wright.ClarkeWrightSolution)).state_hash(), merged)
+
+        construction.undo(0)
+        self.assertEqual(construction.state_hash(), initial)
+
+    def test_from_solution(self):
+        construction = SavingsConstruction(self.data, 8)
+        construction.merge(10, 11)
+        construction.merge(12, 11)
+        construction.merge(6, 16)
+
+        solution = construction.to_solution(clarke_wright.ClarkeWrightSolution)
+        copy = SavingsConstruction.from_solution(solution)
+
+        self.assertEqual(sorted(copy.routes()), sorted(construction.routes()))
+        self.assertEqual(copy.length(), construction.length())
+
+    def test_undo(self):
+        construction = SavingsConstruction(self.data, 8)
+        construction.merge(10, 11)
+
+        routes, length, mark = sorted(construction.routes()), construction.length(), construction.mark()
+
+        construction.merge(12, 11)
+        construction.merge(6, 16)
+        construction.merge(12, 14)
+        construction.undo(mark)
+
+        self.assertEqual(sorted(construction.routes()), routes)
+        self.assertEqual(construction.length(), length)
+        self.assertTrue(construction.can_merge(12, 11))
+
+        construction.undo(0)
+        self.assertEqual(len(construction.routes()), 15)
+
+    def test_has_feasible_merge(self):
+        data = data_input.read_file(path.join(INPUT_DIR, 'Example-n5-k2.vrp'))
+        construction = SavingsConstruction(data, 1)
+
+        self.assertTrue(construction.has_feasible_merge())
+
+        # demands: 2: 37, 3: 35, 4: 30, 5: 25, 6: 32 and capacity 100
+        construction.merge(2, 3)
+        construction.merge(5, 2) # [3, 2, 5]: 97
+        mark = construction.mark()
+        construction.merge(4, 6) # [6, 4]: 62
+
+        self.assertFalse(construction.has_feasible_merge())
+
+        construction.undo(mark)
+        self.assertTrue(construction.has_feasible_merge())
+
+    def test_solution_counters(self):
+        solution = clarke_wright.ClarkeWrightSolution(self.data, 15)
+
+        self.assertTrue(solution.is_complete())
+
+        processed, inserted = solution.process((self.data.node(10), self.data.node(11)))
+
+        self.assertFalse(processed.is_complete())
+        self.assertTrue(processed.has_feasible_merge())
+
+class TranspositionTableTest(unittest.TestCase):
+    """Test binary_mcscws.TranspositionTable"""
+
+    def test_lru(self):
+        table = binary_mcscws.TranspositionTable(max_entries=2)
+
+        table.statistics(1).add(10)
+        table.statistics(2).add(20)
+        self.assertEqual(table.statistics(1).total(), 10) # 2 is now the least recently used
+        table.statistics(3)
+
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.statistics(2).count(), 0) # dropped
+        self.assertEqual((table.hits(), table.misses()), (1, 4))
+
+    def test_max_bytes(self):
+        table = binary_mcscws.TranspositionTable(max_bytes=10 * binary_mcscws.TranspositionTable.ENTRY_BYTES)
+
+        for key in range(20):
+            table.statistics(key)
+
+        self.assertEqual(len(table), 10)
+
+class RolloutSchedulerTest(unittest.TestCase):
+    """Test binary_mcscws.RolloutScheduler"""
+
+    def arm(self, values):
+        arm = sampling.RunningStatistics()
+
+        for value in values:
+            arm.add(value)
+
+        return arm
+
+    def test_bank(self):
+        scheduler = binary_mcscws.RolloutScheduler(budget=100, quota=10, max_quota=15)
+
+        self.assertEqual(scheduler.allowance(), 10)
+        scheduler.spend(4) # an easy decision banks 16 simulations
+        self.assertEqual(scheduler.allowance(), 15)
+        scheduler.spend(30)
+        self.assertEqual(scheduler.allowance(), 13)
+        scheduler.spend(26)
+        self.assertEqual(scheduler.allowance(), 10)
+        scheduler.spend(20)
+        scheduler.spend(20)
+        self.assertEqual(scheduler.remaining(), 0)
+        self.assertEqual(scheduler.allowance(), 0)
+
+    def test_eliminated(self):
+        scheduler = binary_mcscws.RolloutScheduler(budget=100, quota=10, max_quota=15, min_pairs=3)
+
+        self.assertFalse(scheduler.eliminated(self.arm([10, 10]), self.arm([20, 20])))
+        self.assertTrue(scheduler.eliminated(self.arm([10, 11, 10]), self.arm([20, 21, 20])))
+        self.assertFalse(scheduler.eliminated(self.arm([10, 30, 10]), self.arm([20, 5, 20])))
+
+class MonteCarloSolversTest(unittest.TestCase):
+    """Test Monte Carlo based solvers against their reference (clone per pair) mode"""
+
+    def setUp(self):
+        self.data = data_input.read_file(path.join(INPUT_DIR, 'Example-n5-k2.vrp'))
+
+    def solve(self, solver):
+        random.seed(7)
+
+        return solver.solve(self.data, 2, 60)
+
+    def test_monte_carlo_savings(self):
+        solution = self.solve(monte_carlo_savings.MonteCarloSavingsSolver(seed=7))
+        reference = self.solve(monte_carlo_savings.MonteCarloSavingsSolver(reference=True, seed=7))
+
+        self.assertTrue(solution.is_complete())
+        self.assertEqual(route_names(solution), route_names(reference))
+
+    def test_monte_carlo_savings_processes(self):
+        data = read_instance('P-n16-k8')
+
+        solution = monte_carlo_savings.MonteCarloSavingsSolver(seed=7, processes=2).solve(data, 8, 60)
+        again = monte_carlo_savings.MonteCarloSavingsSolver(seed=7, processes=2).solve(data, 8, 60)
+
+        self.assertTrue(solution.is_complete())
+        self.assertEqual(route_names(solution), route_names(again))
+        self.assertEqual(solution.length(), solution.compute_length())
+
+    def test_monte_carlo_savings_processes_timeout(self):
+        data = read_instance('E200-17b', 'Vigo')
+
+        started = time.time()
+        solution = monte_carlo_savings.MonteCarloSavingsSolver(seed=7, processes=2).solve(data, 17, 1)
+
+        self.assertTrue(solution.is_complete())
+        self.assertEqual(solution.length(), solution.compute_length())
+        self.assertLess(time.time() - started, 2)
+
+    def test_monte_carlo_savings_pruning(self):
+        data = read_instance('A-n32-k5')
+
+        solver = monte_carlo_savings.MonteCarloSavingsSolver(seed=1)
+        solution = solver.solve(data, 5, 60)
+        unpruned = monte_carlo_savings.MonteCarloSavingsSolver(seed=1, pruning=False).solve(data, 5, 60)
+
+        self.assertEqual(solution.length(), unpruned.length())
+
+        statistics = solver.statistics()
+        self.assertGreater(statistics['pruned'], 0)
+        self.assertEqual(statistics['simulations'] + statistics['pruned'],
+                         monte_carlo_savings.MonteCarloSavingsSolver.DEFAULT_SIMULATIONS_PER_EXECUTION)
+
+    def test_monte_carlo_savings_pruning_average(self):
+        data = read_instance('A-n32-k5')
+
+        solver = monte_carlo_savings.MonteCarloSavingsSolver(seed=1)
+        output = io.StringIO()
+
+        with contextlib.redirect_stdout(output):
+            solver.solve(data, 5, 60)
+
+        # Pruned simulations have no length: the average only covers the other ones
+        self.assertIn('(over {} non-pruned simulations)'.format(solver.statistics()['simulations']),
+                      output.getvalue())
+
+        output = io.StringIO()
+
+        with contextlib.redirect_stdout(output):
+            monte_carlo_savings.MonteCarloSavingsSolver(seed=1, pruning=False).solve(data, 5, 60)
+
+        self.assertNotIn('non-pruned', output.getvalue())
+
+    def test_lower_bound(self):
+        data = read_instance('A-n32-k5')
+
+        solver = monte_carlo_savings.MonteCarloSavingsSolver(pruning=False)
+        construction = SavingsConstruction(data, 5)
+        best, prefix = savings.best_savings(data)
+        free = solver.free_savings(data)
+
+        # Tighter than the sum of the largest pair savings, at the start
+        self.assertGreater(solver.lower_bound(data, 5, construction, free),
+                           construction.length() - sum(sorted(data.savings()[2].tolist())[-27:]))
+
+        for i, j in savings.compute_savings_list(data).pairs():
+            self.assertLessEqual(solver.lower_bound(data, 5, construction, free), 842)
+
+            if construction.merge(i, j):
+                free = free - best[i] - best[j]
+
+            if construction.is_complete():
+                break
+
+        self.assertEqual(construction.length(), 842)
+        self.assertEqual(solver.lower_bound(data, 5, construction, free), 842)
+
+    def test_best_savings(self):
+        data = read_instance('P-n19-k2')
+        savings_i, savings_j, values = data.savings()
+        best, prefix = savings.best_savings(data)
+
+        pairs = list(zip(savings_i.tolist(), savings_j.tolist(), values.tolist()))
+
+        for i in data.customers().tolist():
+            self.assertEqual(best[i], max([saving for a, b, saving in pairs if i in (a, b)]))
+
+        self.assertEqual(prefix.tolist()[-1], sum(best.tolist()))
+        self.assertEqual(prefix.tolist()[1], min(best[data.customers()].tolist()))
+
+    def test_granular_pruning(self):
+        data = data_input.read_file(path.join(INPUT_DIR, 'Vigo', 'E200-17b.vrp'), lazy=True)
+
+        solver = monte_carlo_savings.MonteCarloSavingsSolver(seed=1, neighbours=20)
+        solution = solver.solve(data, 17, 60)
+
+        self.assertTrue(solution.is_complete())
+        self.assertGreater(solver.statistics()['pruned'], 0)
+
+        # Neither granular lists nor their fallbacks compute the complete list
+        self.assertNotIn('savings', data._precomputed)
+
+    def test_monte_carlo_savings_improvement_threshold(self):
+        data = read_instance('P-n19-k2')
+
+        solver = monte_carlo_savings.MonteCarloSavingsSolver(seed=1, improvement_threshold=0.05)
+        solution = solver.solve(data, 2, 60)
+        complete = monte_carlo_savings.MonteCarloSavingsSolver(seed=1).solve(data, 2, 60)
+
+        statistics = solver.statistics()
+
+        self.assertEqual(solution.length(), complete.length())
+        self.assertGreater(statistics['stopped'], 0)
+        self.assertEqual(statistics['simulations'] + statistics['pruned'] + statistics['stopped'],
+                         monte_carlo_savings.MonteCarloSavingsSolver.DEFAULT_SIMULATIONS_PER_EXECUTION)
+
+    def test_monte_carlo_savings_improvement_threshold_equal_lengths(self):
+        data = data_input.read_file(path.join(INPUT_DIR, 'Example-n5-k2.vrp'))
+
+        solver = monte_carlo_savings.MonteCarloSavingsSolver(seed=2, improvement_threshold=0.05, pruning=False)
+        solution = solver.solve(data, 2, 60)
+
+        # The first simulations all build the same solution, so none is expected to improve it
+        self.assertEqual(solution.length(), 171)
+        self.assertGreater(solver.statistics()['stopped'], 0)
+
+        lengths = sampling.RunningStatistics()
+        for _ in range(10):
+            lengths.add(171)
+
+        self.assertEqual(solver.improvement_probability(lengths, 10, 171, 90), 0.0)
+
+    def test_binary_mcscws_common_random_numbers(self):
+        data = read_instance('P-n16-k8')
+
+        solution = binary_mcscws.BinaryMCSCWSSolver(common_random_numbers=True, seed=3).solve(data, 8, 60)
+        trail = binary_mcscws.BinaryMCSCWSSolver(common_random_numbers=True, seed=3,
+                                                 rollout_mode='trail').solve(data, 8, 60)
+        parallel = binary_mcscws.BinaryMCSCWSSolver(seed=3, processes=2).solve(data, 8, 60)
+
+        self.assertTrue(solution.is_complete())
+        self.assertEqual(route_names(trail), route_names(solution))
+        self.assertEqual(route_names(parallel), route_names(solution))
+        self.assertEqual(parallel.length(), parallel.compute_length())
+
+    def test_binary_mcscws_transposition_table(self):
+        data = read_instance('P-n19-k2')
+
+        solver = binary_mcscws.BinaryMCSCWSSolver(rollout_mode='trail', table_entries=1000)
+        random.seed(1)
+        solution = solver.solve(data, 2, 60)
+        table = solver.transposition_table()
+
+        self.assertTrue(solution.is_complete())
+        self.assertGreater(table.hits(), 0)
+
+        # Every decision after the first one finds one of its states cached
+        self.assertEqual(solver.rollout_count(), 50 * table.misses())
+
+        copy = binary_mcscws.BinaryMCSCWSSolver(table_entries=1000)
+        random.seed(1)
+
+        self.assertEqual(route_names(copy.solve(data, 2, 60)), route_names(solution))
+
+    def test_binary_mcscws_rollout_budget(self):
+        data = read_instance('P-n19-k2')
+
+        solver = binary_mcscws.BinaryMCSCWSSolver(rollout_mode='trail', common_random_numbers=True, seed=1,
+                                                  rollout_budget=1000)
+        solution = solver.solve(data, 2, 60)
+
+        self.assertTrue(solution.is_complete())
+        self.assertEqual(solver.rollout_count(), 1000)
+
+    def test_binary_mcscws_significance(self):
+        data = read_instance('P-n16-k8')
+
+        random.seed(1)
+        solver = binary_mcscws.BinaryMCSCWSSolver(rollout_mode='trail')
+        solution = solver.solve(data, 8, 60)
+        random.seed(1)
+        sequential = binary_mcscws.BinaryMCSCWSSolver(rollout_mode='trail', significance=0.05)
+        sequential_solution = sequential.solve(data, 8, 60)
+
+        self.assertTrue(sequential_solution.is_complete())
+        self.assertEqual(sequential_solution.length(), solution.length())
+        self.assertLess(sequential.rollout_count(), solver.rollout_count())
+
+    def test_monte_carlo_savings_incumbents(self):
+        data = read_instance('P-n16-k8')
+
+        for processes in [1, 2]:
+            solver = monte_carlo_savings.MonteCarloSavingsSolver(seed=7, processes=processes)
+            incumbents = list(solver.incumbents(data, 8, 60))
+
+            self.assertTrue(incumbents)
+            self.assertTrue(all([incumbent.solution.is_complete() for incumbent in incumbents]))
+            self.assertEqual([incumbent.cost for incumbent in incumbents],
+                             sorted(set([incumbent.cost for incumbent in incumbents]), reverse=True))
+            self.assertEqual([incumbent.iteration for incumbent in incumbents],
+                             sorted([incumbent.iteration for incumbent in incumbents]))
+
+            # Any solution reaches the target
+            reached = list(solver.incumbents(data, 8, 60, target=incumbents[0].cost))
+            self.assertEqual(len(reached), 1)
+
+    def test_binary_mcscws_incumbents(self):
+        data = read_instance('P-n16-k8')
+
+        for rollout_mode in binary_mcscws.BinaryMCSCWSSolver.ROLLOUT_MODES:
+            random.seed(1)
+            solver = binary_mcscws.BinaryMCSCWSSolver(rollout_mode=rollout_mode)
+            incumbents = list(solver.incumbents(data, 8, 60))
+            random.seed(1)
+            solution = binary_mcscws.BinaryMCSCWSSolver(rollout_mode=rollout_mode).solve(data, 8, 60)
+
+            # Intermediate solutions, found by simulations before the end of the solve
+            self.assertGreater(len(incumbents), 1)
+            self.assertTrue(all([incumbent.solution.is_complete() for incumbent in incumbents]))
+            self.assertEqual([incumbent.cost for incumbent in incumbents],
+                             sorted(set([incumbent.cost for incumbent in incumbents]), reverse=True))
+            self.assertLess(incumbents[0].iteration, solver.rollout_count())
+            self.assertEqual(incumbents[-1].cost, solution.length())
+
+            random.seed(1)
+            reached = list(solver.incumbents(data, 8, 60, target=incumbents[0].cost))
+            self.assertEqual(len(reached), 1)
+            self.assertLess(solver.rollout_count(), incumbents[-1].iteration)
+
+    def test_binary_mcscws(self):
+        solution = self.solve(binary_mcscws.BinaryMCSCWSSolver())
+        reference = self.solve(binary_mcscws.BinaryMCSCWSSolver(reference=True))
+
+        self.assertTrue(solution.is_complete())
+        self.assertEqual(route_names(solution), route_names(reference))
+        self.assertEqual(solution.length(), 171)
+
+    def test_binary_mcscws_trail_rollouts(self):
+        data = read_instance('P-n16-k8')
+
+        random.seed(5)
+        solution = binary_mcscws.BinaryMCSCWSSolver().solve(data, 8, 60)
+        random.seed(5)
+        trail = binary_mcscws.BinaryMCSCWSSolver(rollout_mode='trail').solve(data, 8, 60)
+
+        self.assertEqual(route_names(trail), route_names(solution))
+
+if __name__ == '__main__':
+    unittest.main()